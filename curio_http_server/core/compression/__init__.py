@@ -0,0 +1,74 @@
+from zlib import DEFLATED
+from zlib import Z_SYNC_FLUSH
+from zlib import compressobj
+
+
+DEFAULT_CONTENT_TYPES = (
+    'application/javascript',
+    'application/json',
+    'application/xml',
+    'image/svg+xml',
+    'text/*',
+)
+
+
+# Window bits selecting container format, see zlib documentation.
+ENCODING_WBITS = {
+    'gzip': 31,
+    'deflate': 15,
+}
+
+
+class Compressor(object):
+    __slots__ = 'encoding', '_compressobj'
+
+    def __init__(self, encoding, level):
+        self.encoding = encoding
+        self._compressobj = compressobj(level, DEFLATED, ENCODING_WBITS[encoding])
+
+    def compress(self, data):
+        # Sync flush, so every stream write reaches client immediately.
+        return self._compressobj.compress(data) + self._compressobj.flush(Z_SYNC_FLUSH)
+
+    def finish(self, data=b''):
+        return self._compressobj.compress(data) + self._compressobj.flush()
+
+
+class Compression(object):
+    def __init__(self, minimum_length=1024, level=6, content_types=DEFAULT_CONTENT_TYPES, encodings=('gzip', 'deflate')):
+        self.minimum_length = minimum_length
+        self.level = level
+        self.encodings = tuple(encodings)
+        self._content_types = frozenset(content_type for content_type in content_types if not content_type.endswith('/*'))
+        self._content_type_prefixes = tuple(content_type[:-1] for content_type in content_types if content_type.endswith('/*'))
+
+        for encoding in self.encodings:
+            if encoding not in ENCODING_WBITS:
+                raise RuntimeError(f'Compression encoding "{encoding}" is not supported.')
+
+    def is_compressible(self, content_type):
+        if not content_type:
+            return False
+
+        content_type = content_type.split(';', 1)[0].strip().lower()
+
+        return (content_type in self._content_types) or content_type.startswith(self._content_type_prefixes)
+
+    def select_encoding(self, accept_encoding):
+        if accept_encoding is None:
+            return None
+
+        final_encoding = None
+        final_quality = 0.0
+
+        for encoding in self.encodings:
+            quality = accept_encoding.get_quality(encoding)
+
+            if quality > final_quality:
+                final_encoding = encoding
+                final_quality = quality
+
+        return final_encoding
+
+    def create_compressor(self, encoding):
+        return Compressor(encoding, self.level)
@@ -0,0 +1,127 @@
+from collections import deque
+from curio import Event
+from curio import TaskTimeout
+from curio import current_task
+from itertools import islice
+
+
+def format_event(data, event=None, id=None, retry=None):
+    # Server-sent event in text/event-stream format. Data is str or bytes, multiline data is split into several fields.
+    if type(data) is str:
+        data = data.encode('utf-8')
+
+    lines = []
+
+    for name, value in (('event', event), ('id', id)):
+        if value is not None:
+            if type(value) is not bytes:
+                value = str(value).encode('utf-8')
+
+            if (b'\n' in value) or (b'\r' in value):
+                raise RuntimeError(f'Event {name} "{value}" must not contain line breaks.')
+
+            lines.append(b'%b: %b' % (name.encode('ascii'), value))
+
+    if retry is not None:
+        lines.append(b'retry: %d' % retry)
+
+    for line in data.splitlines() or (b'',):
+        lines.append(b'data: %b' % line)
+
+    lines.append(b'\n')
+
+    return b'\n'.join(lines)
+
+
+HEARTBEAT_EVENT = b':\n\n'
+
+
+class EventHub(object):
+    # In-process publish/subscribe for server-sent events. Every event is formatted once and the same bytes are
+    # written to all subscribers. Hub keeps last queue_size events, subscriber which falls further behind either
+    # skips missed events or, if disconnect_slow is True, is disconnected, so slow clients never hold memory.
+    # Idle subscribers receive heartbeat comment every heartbeat_interval seconds.
+    def __init__(self, queue_size=256, heartbeat_interval=15, disconnect_slow=False):
+        self.queue_size = queue_size
+        self.heartbeat_interval = heartbeat_interval
+        self.disconnect_slow = disconnect_slow
+        self.subscribers_count = 0
+        self.dropped_count = 0
+        # (event id, formatted event), sequence number of last event is _sequence.
+        self._events = deque(maxlen=queue_size)
+        self._sequence = 0
+        self._published = Event()
+        # Task -> position of subscribers blocked in write, only they can fall behind without noticing it.
+        self._writing = {}
+
+    async def publish(self, data, event=None, id=None, retry=None):
+        self._events.append((None if id is None else str(id), format_event(data, event, id, retry)))
+        self._sequence += 1
+        # Single event wakes all subscribers, new one is created for next publication.
+        published, self._published = self._published, Event()
+        await published.set()
+
+        if self.disconnect_slow and self._writing:
+            oldest_position = self._sequence - len(self._events)
+
+            for task, position in tuple(self._writing.items()):
+                if position < oldest_position:
+                    del self._writing[task]
+                    self.dropped_count += 1
+                    await task.cancel(blocking=False)
+
+    def _get_resume_position(self, last_event_id):
+        # Client reconnecting with Last-Event-ID receives events it missed if they are still kept.
+        if last_event_id is not None:
+            for index, (event_id, _) in enumerate(reversed(self._events)):
+                if event_id == last_event_id:
+                    return self._sequence - index
+
+        return self._sequence
+
+    async def serve(self, request, response, buffer_size=0):
+        # Streams events to client until it is gone, disconnected as slow or server is shutting down.
+        connection = response._connection
+        task = await current_task()
+        position = self._get_resume_position(request.headers.get('Last-Event-ID'))
+        self.subscribers_count += 1
+
+        try:
+            async with response.open_event_stream(buffer_size) as stream:
+                connection.server._end_in_flight(request)
+
+                while not connection.server.is_shutting_down:
+                    if position == self._sequence:
+                        published = self._published
+
+                        try:
+                            async with connection.timeout(self.heartbeat_interval):
+                                await published.wait()
+                        except TaskTimeout:
+                            await stream.send_prepared((HEARTBEAT_EVENT,))
+
+                            continue
+
+                    missed_count = self._sequence - position - len(self._events)
+
+                    if missed_count > 0:
+                        self.dropped_count += 1
+
+                        if self.disconnect_slow:
+                            request.keep_alive = False
+
+                            break
+
+                        position += missed_count
+
+                    pending_count = self._sequence - position
+                    position = self._sequence
+                    # Usually only last few events are pending, so they are taken from the end.
+                    events = [data for _, data in islice(reversed(self._events), pending_count)]
+                    events.reverse()
+                    self._writing[task] = position
+                    await stream.send_prepared(events)
+                    self._writing.pop(task, None)
+        finally:
+            self._writing.pop(task, None)
+            self.subscribers_count -= 1
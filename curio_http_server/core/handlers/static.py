@@ -1,50 +1,317 @@
 from ..headers import ContentTypeHeader
+from ..headers import ETagHeader
+from collections import OrderedDict
+from curio import Semaphore
+from curio import run_in_thread
 from datetime import datetime
+from datetime import timezone
 from mimetypes import guess_type
+from os import fstat
 from os import scandir
 from os import stat
 from os.path import abspath
 from os.path import dirname
-from os.path import isdir
-from os.path import isfile
 from os.path import join
+from stat import S_ISDIR
+from stat import S_ISREG
+from time import monotonic
+
+
+PRECOMPRESSED_SUFFIXES = {
+    'br': '.br',
+    'gzip': '.gz',
+}
+
+
+def _scan_directory(path):
+    return [(entry.name, entry.is_dir(), entry.stat()) for entry in scandir(path)]
+
+
+class _StaticFile(object):
+    __slots__ = 'path', 'is_file', 'is_dir', 'mtime_ns', 'size', 'content_type', 'etag', 'last_modified', 'data', 'checked'
+
+    @classmethod
+    def _from_path(cls, path):
+        try:
+            stat_result = stat(path)
+        except OSError:
+            return cls(path, None)
+
+        return cls(path, stat_result)
+
+    def __init__(self, path, stat_result):
+        self.path = path
+        self.content_type = None
+        self.etag = None
+        self.last_modified = None
+        self.data = None
+        self.checked = 0.0
+
+        if stat_result is None:
+            self.is_file = False
+            self.is_dir = False
+            self.mtime_ns = None
+            self.size = None
+        else:
+            self.is_file = S_ISREG(stat_result.st_mode)
+            self.is_dir = S_ISDIR(stat_result.st_mode)
+            self.mtime_ns = stat_result.st_mtime_ns
+            self.size = stat_result.st_size
+
+            if self.is_file:
+                mime_type = guess_type(path)[0]
+
+                if mime_type:
+                    self.content_type = ContentTypeHeader(mime_type)
+
+                # Cheap validator, no need to read file content.
+                self.etag = ETagHeader(f'{self.mtime_ns:x}-{self.size:x}')
+                self.last_modified = datetime.fromtimestamp(stat_result.st_mtime, timezone.utc)
+
+    def is_same(self, other):
+        return (self.is_file == other.is_file) and (self.is_dir == other.is_dir) and (self.mtime_ns == other.mtime_ns) and (self.size == other.size)
+
+
+class _StaticFileCache(object):
+    # LRU cache of file metadata and small file contents limited by total size.
+    # Missing files are cached too, so repeated 404 lookups do not touch file system.
+    # Entries are trusted for ttl seconds, then validated with stat.
+    ENTRY_OVERHEAD = 512
+
+    def __init__(self, max_size, ttl, data_limit):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.data_limit = data_limit
+        self._size = 0
+        self._entries = OrderedDict()
+
+    def _get_entry_size(self, entry):
+        return self.ENTRY_OVERHEAD + (len(entry.data) if entry.data is not None else 0)
+
+    def _remove(self, path):
+        entry = self._entries.pop(path, None)
+
+        if entry:
+            self._size -= self._get_entry_size(entry)
+
+    def _load(self, path):
+        entry = _StaticFile._from_path(path)
+
+        if entry.is_file and (entry.size <= self.data_limit):
+            try:
+                with open(path, 'rb') as file:
+                    entry = _StaticFile(path, fstat(file.fileno()))
+                    data = file.read()
+
+                if len(data) == entry.size:
+                    entry.data = data
+            except OSError:
+                entry = _StaticFile(path, None)
+
+        return entry
+
+    async def lookup(self, path, run_blocking):
+        # File system is accessed with run_blocking only, cache itself is modified in event loop thread.
+        now = monotonic()
+        entry = self._entries.get(path)
+
+        if entry is not None:
+            if now - entry.checked < self.ttl:
+                self._entries.move_to_end(path)
+
+                return entry
+
+            if entry.is_same(await run_blocking(_StaticFile._from_path, path)):
+                entry.checked = now
+
+                if self._entries.get(path) is entry:
+                    self._entries.move_to_end(path)
+
+                return entry
+
+        entry = await run_blocking(self._load, path)
+        entry.checked = now
+        entry_size = self._get_entry_size(entry)
+        self._remove(path)
+
+        if entry_size <= self.max_size:
+            self._entries[path] = entry
+            self._size += entry_size
+
+            while self._size > self.max_size:
+                _, old_entry = self._entries.popitem(last=False)
+                self._size -= self._get_entry_size(old_entry)
+
+        return entry
+
+
+class _CompressedCache(object):
+    # LRU cache of compressed file contents limited by total size, entries are invalidated by mtime and size.
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._size = 0
+        self._entries = OrderedDict()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+
+        if entry:
+            self._size -= len(entry[2])
+
+    def get(self, key, static_file):
+        entry = self._entries.get(key)
+
+        if entry is None:
+            return None
+
+        if (entry[0] != static_file.mtime_ns) or (entry[1] != static_file.size):
+            self._remove(key)
+
+            return None
+
+        self._entries.move_to_end(key)
+
+        return entry[2]
+
+    def put(self, key, static_file, data):
+        self._remove(key)
+
+        if len(data) > self.max_size:
+            return
+
+        self._entries[key] = (static_file.mtime_ns, static_file.size, data)
+        self._size += len(data)
+
+        while self._size > self.max_size:
+            _, (_, _, old_data) = self._entries.popitem(last=False)
+            self._size -= len(old_data)
 
 
 class StaticHandler(object):
-    def __init__(self, base_path, index=True, single_chunk_limit=64*1024):
+    # precompressed lists encodings of sidecar files, e.g. ('br', 'gzip') serves "file.br" or "file.gz" if present.
+    # compression is compression.Compression instance, files are compressed on first request and cached in memory.
+    # cache_size enables cache of file metadata and contents of files up to single_chunk_limit bytes, see _StaticFileCache.
+    # thread_pool_size limits number of threads doing blocking open, stat and read calls, calls are made in event loop if 0.
+    # Files are sent with sendfile in event loop regardless, see Connection11.write_file.
+    def __init__(
+            self, base_path, index=True, single_chunk_limit=64*1024, precompressed=(), compression=None, compressed_cache_size=16*1024*1024,
+            cache_size=0, cache_ttl=1.0, thread_pool_size=16):
         self._base_path = abspath(base_path)
         self._index = index
         self._single_chunk_limit = single_chunk_limit
+        self._precompressed = tuple(precompressed)
+        self._compression = compression
+        self._compressed_cache = _CompressedCache(compressed_cache_size) if compression else None
+        self._file_cache = _StaticFileCache(cache_size, cache_ttl, single_chunk_limit) if cache_size else None
+        self._thread_semaphore = Semaphore(thread_pool_size) if thread_pool_size else None
+
+        for encoding in self._precompressed:
+            if encoding not in PRECOMPRESSED_SUFFIXES:
+                raise RuntimeError(f'Precompressed encoding "{encoding}" is not supported.')
+
+    async def _run_blocking(self, function, *args):
+        if self._thread_semaphore is None:
+            return function(*args)
+
+        async with self._thread_semaphore:
+            return await run_in_thread(function, *args)
+
+    async def _lookup(self, path):
+        if self._file_cache:
+            return await self._file_cache.lookup(path, self._run_blocking)
+
+        return await self._run_blocking(_StaticFile._from_path, path)
+
+    def _set_file_headers(self, response, static_file, encoding):
+        response.headers.last_modified = static_file.last_modified
+
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+            response.headers.etag = ETagHeader(f'{static_file.etag.tag}-{encoding}')
+        else:
+            response.headers.etag = static_file.etag
+
+    async def _send_file(self, response, static_file, encoding=None):
+        self._set_file_headers(response, static_file, encoding)
+
+        if static_file.data is not None:
+            await response.send_buffer(static_file.data)
+        else:
+            with await self._run_blocking(open, static_file.path, 'rb') as file:
+                # Size is known, so no chunked encoding, file is sent by kernel without copying when possible.
+                await response.send_file(file, 0, static_file.size, self._single_chunk_limit, self._run_blocking)
+
+    async def _try_send_precompressed(self, request, response, static_file):
+        accept_encoding = request.headers.accept_encoding
+
+        if accept_encoding is None:
+            return False
+
+        encodings = [encoding for encoding in self._precompressed if accept_encoding.get_quality(encoding) > 0]
+        encodings.sort(key=accept_encoding.get_quality, reverse=True)
+
+        for encoding in encodings:
+            encoded_file = await self._lookup(static_file.path + PRECOMPRESSED_SUFFIXES[encoding])
+
+            if encoded_file.is_file:
+                await self._send_file(response, encoded_file, encoding)
+
+                return True
+
+        return False
+
+    def _compress_file(self, static_file, encoding):
+        compressor = self._compression.create_compressor(encoding)
+
+        if static_file.data is not None:
+            return static_file, compressor.finish(static_file.data)
+
+        with open(static_file.path, 'rb') as file:
+            return _StaticFile(static_file.path, fstat(file.fileno())), compressor.finish(file.read())
+
+    async def _try_send_compressed(self, request, response, static_file):
+        encoding = self._compression.select_encoding(request.headers.accept_encoding)
+
+        if encoding is None:
+            return False
+
+        if not (self._compression.minimum_length <= static_file.size <= self._compressed_cache.max_size):
+            return False
+
+        key = (static_file.path, encoding)
+        data = self._compressed_cache.get(key, static_file)
+
+        if data is None:
+            static_file, data = await self._run_blocking(self._compress_file, static_file, encoding)
+            self._compressed_cache.put(key, static_file, data)
+
+        self._set_file_headers(response, static_file, encoding)
+
+        await response.send_buffer(data)
+
+        return True
 
     async def get(self, request, response, path):
         final_path = abspath(join(self._base_path, path))
+        static_file = await self._lookup(final_path)
 
-        if isfile(final_path):
-            stat_result = stat(final_path)
-            mime_type = guess_type(final_path)[0]
+        if static_file.is_file:
+            if static_file.content_type:
+                response.headers.content_type = static_file.content_type
 
-            if mime_type:
-                response.headers.content_type = ContentTypeHeader(mime_type)
+            is_compressible = bool(self._compression) and self._compression.is_compressible(str(static_file.content_type or ''))
 
-            response.headers.last_modified = datetime.fromtimestamp(stat_result.st_mtime)
+            if self._precompressed or is_compressible:
+                response._add_vary('Accept-Encoding')
 
-            if stat_result.st_size < self._single_chunk_limit:
-                response.headers.content_length = stat_result.st_size
+            if self._precompressed and await self._try_send_precompressed(request, response, static_file):
+                return
 
-                with open(final_path, 'rb') as file:
-                    data = file.read()
-                    await response.send_body(data)
-            else:
-                with open(final_path, 'rb') as file:
-                    async with response.open_body() as stream:
-                        while True:
-                            data = file.read(self._single_chunk_limit)
-
-                            if not data:
-                                break
-
-                            await stream.write(data)
-        elif isdir(final_path) and self._index:
+            if is_compressible and await self._try_send_compressed(request, response, static_file):
+                return
+
+            await self._send_file(response, static_file)
+        elif static_file.is_dir and self._index:
             result = f'''
 <html>
     <head>
@@ -64,14 +331,13 @@ tr > *:nth-child(3) {{ text-align: right; }}
             <tr><th>Name</th><th>Last modified</th><th>Size</th></tr>
 '''
 
-            for entry in scandir(final_path):
-                stat_result = entry.stat()
+            for name, is_dir, stat_result in await self._run_blocking(_scan_directory, final_path):
                 mtime = datetime.fromtimestamp(stat_result.st_mtime)
 
-                if entry.is_dir():
-                    result += f'<tr><td><a href="{join(path, entry.name)}/">{entry.name}/</a></td><td>{mtime:%Y-%m-%d %H:%M:%S}</td><td>-</td></tr>'
+                if is_dir:
+                    result += f'<tr><td><a href="{join(path, name)}/">{name}/</a></td><td>{mtime:%Y-%m-%d %H:%M:%S}</td><td>-</td></tr>'
                 else:
-                    result += f'<tr><td><a href="{join(path, entry.name)}">{entry.name}</a></td><td>{mtime:%Y-%m-%d %H:%M:%S}</td><td>{stat_result.st_size:,d}</td></tr>'
+                    result += f'<tr><td><a href="{join(path, name)}">{name}</a></td><td>{mtime:%Y-%m-%d %H:%M:%S}</td><td>{stat_result.st_size:,d}</td></tr>'
 
             result += '''
         </table>
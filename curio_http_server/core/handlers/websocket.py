@@ -0,0 +1,474 @@
+from base64 import b64decode
+from base64 import b64encode
+from binascii import Error as BinasciiError
+from curio import Lock
+from curio import TaskTimeout
+from curio import sleep
+from curio import spawn
+from hashlib import sha1
+from struct import pack
+from time import monotonic
+from zlib import DEFLATED
+from zlib import Z_SYNC_FLUSH
+from zlib import compressobj
+from zlib import decompressobj
+from zlib import error as ZlibError
+
+
+# RFC 6455, section 1.3.
+WEBSOCKET_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+OPCODE_CONTINUATION = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+CLOSE_NORMAL = 1000
+CLOSE_GOING_AWAY = 1001
+CLOSE_PROTOCOL_ERROR = 1002
+CLOSE_INVALID_DATA = 1007
+CLOSE_MESSAGE_TOO_BIG = 1009
+
+# Removed from end of every compressed message and restored before decompression, RFC 7692, section 7.2.1.
+DEFLATE_TAIL = b'\x00\x00\xff\xff'
+
+
+def _unmask(payload, mask):
+    # Whole payload is XORed as one big integer, it is much faster than byte by byte loop.
+    length = len(payload)
+
+    if length == 0:
+        return b''
+
+    mask = (mask * (length // 4 + 1))[:length]
+
+    return (int.from_bytes(payload, 'big') ^ int.from_bytes(mask, 'big')).to_bytes(length, 'big')
+
+
+class _CloseError(Exception):
+    # Connection must be closed with code because of client's fault.
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+class _PerMessageDeflate(object):
+    # RFC 7692. Compression context of server is kept between messages unless client asks otherwise,
+    # decompression context is kept unless client promised not to keep it.
+    __slots__ = 'response_header', 'level', '_wbits', '_compressor', '_decompressor', '_is_server_no_context_takeover', '_is_client_no_context_takeover'
+
+    @classmethod
+    def _negotiate(cls, header_value, level):
+        # Returns instance for first acceptable offer, None if no offer is acceptable.
+        for offer in header_value.split(','):
+            parts = [part.strip() for part in offer.split(';')]
+
+            if parts[0].lower() != 'permessage-deflate':
+                continue
+
+            params = {}
+
+            for part in parts[1:]:
+                name, _, value = part.partition('=')
+                params[name.strip().lower()] = value.strip().strip('"')
+
+            if not (params.keys() <= {'server_no_context_takeover', 'client_no_context_takeover', 'server_max_window_bits', 'client_max_window_bits'}):
+                continue
+
+            wbits = 15
+            response_parts = ['permessage-deflate']
+
+            if 'server_no_context_takeover' in params:
+                response_parts.append('server_no_context_takeover')
+
+            if 'client_no_context_takeover' in params:
+                response_parts.append('client_no_context_takeover')
+
+            if 'server_max_window_bits' in params:
+                value = params['server_max_window_bits']
+
+                # zlib does not support raw deflate with 8 bits window.
+                if not (value.isdigit() and (9 <= int(value) <= 15)):
+                    continue
+
+                wbits = int(value)
+                response_parts.append(f'server_max_window_bits={wbits}')
+
+            return cls(
+                '; '.join(response_parts), level, wbits,
+                'server_no_context_takeover' in params, 'client_no_context_takeover' in params)
+
+        return None
+
+    def __init__(self, response_header, level, wbits, is_server_no_context_takeover, is_client_no_context_takeover):
+        self.response_header = response_header
+        self.level = level
+        self._wbits = wbits
+        self._is_server_no_context_takeover = is_server_no_context_takeover
+        self._is_client_no_context_takeover = is_client_no_context_takeover
+        self._compressor = None
+        self._decompressor = None
+
+    def compress(self, data):
+        compressor = self._compressor or compressobj(self.level, DEFLATED, -self._wbits)
+
+        if not self._is_server_no_context_takeover:
+            self._compressor = compressor
+
+        data = compressor.compress(data) + compressor.flush(Z_SYNC_FLUSH)
+
+        if data.endswith(DEFLATE_TAIL):
+            data = data[:-len(DEFLATE_TAIL)]
+
+        return data
+
+    def decompress(self, data, max_length):
+        decompressor = self._decompressor or decompressobj(-15)
+
+        if not self._is_client_no_context_takeover:
+            self._decompressor = decompressor
+
+        try:
+            # Output is limited, so small compressed message cannot expand to huge one.
+            data = decompressor.decompress(bytes(data) + DEFLATE_TAIL, max_length + 1)
+        except ZlibError:
+            raise _CloseError(CLOSE_INVALID_DATA)
+
+        if len(data) > max_length:
+            raise _CloseError(CLOSE_MESSAGE_TOO_BIG)
+
+        return data
+
+
+class WebSocket(object):
+    # Message oriented connection, receive returns str or bytes, send accepts them.
+    # Control frames are handled by receive, so it should be called even if handler only sends messages.
+    __slots__ = (
+        'protocol', 'max_message_length', 'compression_minimum_length', '_connection', '_deflate', '_buffer', '_write_lock',
+        '_is_closed', '_is_close_sent', '_ping_time', '_pong_time')
+
+    def __init__(self, connection, protocol=None, deflate=None, max_message_length=1024*1024, compression_minimum_length=128):
+        self.protocol = protocol
+        self.max_message_length = max_message_length
+        self.compression_minimum_length = compression_minimum_length
+        self._connection = connection
+        self._deflate = deflate
+        # Client may send frames right after handshake, they could be received with request headers.
+        self._buffer = bytearray(connection.upgrade_data)
+        self._write_lock = Lock()
+        self._is_closed = False
+        self._is_close_sent = False
+        self._ping_time = None
+        self._pong_time = None
+
+    @property
+    def is_closed(self):
+        return self._is_closed or self._is_close_sent
+
+    async def _fill(self, length):
+        while len(self._buffer) < length:
+            data = await self._connection.read_request_into()
+
+            if not data:
+                raise EOFError('WebSocket connection is closed.')
+
+            self._buffer += data
+
+    async def _read_frame(self):
+        await self._fill(2)
+        first, second = self._buffer[0], self._buffer[1]
+        length = second & 0x7F
+        position = 2
+
+        if not (second & 0x80):
+            # Client must mask every frame, RFC 6455, section 5.1.
+            raise _CloseError(CLOSE_PROTOCOL_ERROR)
+
+        if length == 126:
+            await self._fill(4)
+            length = int.from_bytes(self._buffer[2:4], 'big')
+            position = 4
+        elif length == 127:
+            await self._fill(10)
+            length = int.from_bytes(self._buffer[2:10], 'big')
+            position = 10
+
+        if length > self.max_message_length:
+            raise _CloseError(CLOSE_MESSAGE_TOO_BIG)
+
+        await self._fill(position + 4 + length)
+        mask = bytes(self._buffer[position:position + 4])
+        payload = _unmask(self._buffer[position + 4:position + 4 + length], mask)
+        del self._buffer[:position + 4 + length]
+
+        return bool(first & 0x80), first & 0x70, first & 0x0F, payload
+
+    async def _send_frame(self, opcode, payload, rsv=0):
+        if self._is_close_sent:
+            raise EOFError('WebSocket connection is closed.')
+
+        length = len(payload)
+
+        if length < 126:
+            header = pack('!BB', 0x80 | rsv | opcode, length)
+        elif length < 65536:
+            header = pack('!BBH', 0x80 | rsv | opcode, 126, length)
+        else:
+            header = pack('!BBQ', 0x80 | rsv | opcode, 127, length)
+
+        if opcode == OPCODE_CLOSE:
+            self._is_close_sent = True
+
+        # Frames of concurrent senders must not interleave. Write returns only when data is accepted by kernel,
+        # so sender is slowed down to speed of client.
+        async with self._write_lock:
+            await self._connection.write_response_vector((header, payload))
+
+    async def _handle_control_frame(self, is_final, opcode, payload):
+        if (not is_final) or (len(payload) > 125):
+            raise _CloseError(CLOSE_PROTOCOL_ERROR)
+
+        if opcode == OPCODE_CLOSE:
+            if len(payload) == 1:
+                raise _CloseError(CLOSE_PROTOCOL_ERROR)
+
+            self._is_closed = True
+
+            if not self._is_close_sent:
+                # Echo status code, RFC 6455, section 5.5.1.
+                await self._send_frame(OPCODE_CLOSE, payload[:2])
+        elif opcode == OPCODE_PING:
+            if not self._is_close_sent:
+                await self._send_frame(OPCODE_PONG, payload)
+        elif opcode == OPCODE_PONG:
+            self._pong_time = monotonic()
+        else:
+            raise _CloseError(CLOSE_PROTOCOL_ERROR)
+
+    async def receive(self):
+        # Returns None when connection is closed.
+        if self._is_closed:
+            return None
+
+        fragments = []
+        message_opcode = None
+        is_compressed = False
+        length = 0
+
+        try:
+            while True:
+                is_final, rsv, opcode, payload = await self._read_frame()
+
+                if opcode & 0x8:
+                    if rsv:
+                        raise _CloseError(CLOSE_PROTOCOL_ERROR)
+
+                    await self._handle_control_frame(is_final, opcode, payload)
+
+                    if self._is_closed:
+                        return None
+
+                    continue
+
+                if opcode == OPCODE_CONTINUATION:
+                    if (message_opcode is None) or rsv:
+                        raise _CloseError(CLOSE_PROTOCOL_ERROR)
+                elif (opcode in (OPCODE_TEXT, OPCODE_BINARY)) and (message_opcode is None):
+                    message_opcode = opcode
+                    is_compressed = rsv == 0x40
+
+                    if (rsv and not is_compressed) or (is_compressed and (self._deflate is None)):
+                        raise _CloseError(CLOSE_PROTOCOL_ERROR)
+                else:
+                    raise _CloseError(CLOSE_PROTOCOL_ERROR)
+
+                length += len(payload)
+
+                if length > self.max_message_length:
+                    raise _CloseError(CLOSE_MESSAGE_TOO_BIG)
+
+                fragments.append(payload)
+
+                if is_final:
+                    break
+
+            data = fragments[0] if len(fragments) == 1 else b''.join(fragments)
+
+            if is_compressed:
+                data = self._deflate.decompress(data, self.max_message_length)
+
+            if message_opcode == OPCODE_TEXT:
+                try:
+                    return data.decode('utf-8')
+                except UnicodeDecodeError:
+                    raise _CloseError(CLOSE_INVALID_DATA)
+
+            return data
+        except _CloseError as error:
+            await self.close(error.code)
+            self._is_closed = True
+
+            return None
+        except EOFError:
+            self._is_closed = True
+
+            return None
+
+    async def send(self, data):
+        # Message is text if data is str, binary otherwise. Raises EOFError if connection is closed.
+        if type(data) is str:
+            opcode = OPCODE_TEXT
+            data = data.encode('utf-8')
+        else:
+            opcode = OPCODE_BINARY
+
+        if (self._deflate is not None) and (len(data) >= self.compression_minimum_length):
+            await self._send_frame(opcode, self._deflate.compress(data), 0x40)
+        else:
+            await self._send_frame(opcode, data)
+
+    async def ping(self, data=b''):
+        self._ping_time = monotonic()
+        await self._send_frame(OPCODE_PING, data)
+
+    async def close(self, code=CLOSE_NORMAL, reason=''):
+        if not self._is_close_sent:
+            try:
+                await self._send_frame(OPCODE_CLOSE, code.to_bytes(2, 'big') + reason.encode('utf-8')[:123])
+            except (OSError, EOFError, TaskTimeout):
+                self._is_closed = True
+
+    async def _finish(self, timeout):
+        # Closing handshake, client's close frame is awaited, so client does not see connection reset.
+        await self.close()
+
+        try:
+            async with self._connection.timeout(timeout):
+                while not self._is_closed:
+                    await self.receive()
+        except TaskTimeout:
+            pass
+
+    async def _keep_alive(self, interval, server):
+        # Runs in its own task, so write timeout of ping applies to this task, not to handler.
+        # Client which did not answer previous ping or did not accept ping in time is considered gone,
+        # its connection is cancelled, so handler does not wait for it forever.
+        try:
+            while not self.is_closed:
+                await sleep(interval)
+
+                if server.is_shutting_down:
+                    await self.close(CLOSE_GOING_AWAY)
+
+                    return
+
+                if (self._ping_time is not None) and ((self._pong_time is None) or (self._pong_time < self._ping_time)):
+                    break
+
+                await self.ping()
+            else:
+                return
+        except EOFError:
+            # Connection is being closed by handler.
+            return
+        except (OSError, TaskTimeout):
+            # Ping may be written partially, connection cannot be used anymore.
+            pass
+
+        await self._connection.task.cancel(blocking=False)
+
+
+class WebSocketHandler(object):
+    # handler(request, websocket, **parameters) serves accepted connection, connection is closed when it returns.
+    # Handles GET requests only, e.g. router.add('/chat', WebSocketHandler(chat), 'GET').
+    # protocols lists supported subprotocols in order of preference, compression_level enables permessage-deflate if not None.
+    # Clients are pinged every ping_interval seconds and disconnected if they do not answer before next ping.
+    def __init__(
+            self, handler, protocols=(), max_message_length=1024*1024, compression_level=6, compression_minimum_length=128,
+            ping_interval=20, close_timeout=5):
+        self._handler = handler
+        self._protocols = tuple(protocols)
+        self._max_message_length = max_message_length
+        self._compression_level = compression_level
+        self._compression_minimum_length = compression_minimum_length
+        self._ping_interval = ping_interval
+        self._close_timeout = close_timeout
+
+    def _select_protocol(self, request):
+        offered = [
+            protocol.strip()
+            for value in request.headers.getall('Sec-WebSocket-Protocol', ())
+            for protocol in value.split(',')]
+
+        for protocol in self._protocols:
+            if protocol in offered:
+                return protocol
+
+        return None
+
+    async def serve(self, request, websocket, **parameters):
+        await self._handler(request, websocket, **parameters)
+
+    async def get(self, request, response, **parameters):
+        connection = response._connection
+        upgrade_value = request.headers.get('Upgrade', '').lower()
+
+        if (not request.upgrade) or connection.is_framed or ('websocket' not in upgrade_value):
+            response.status_code = 426
+            response.headers['Upgrade'] = 'websocket'
+
+            return
+
+        if request.headers.get('Sec-WebSocket-Version') != '13':
+            response.status_code = 426
+            response.headers['Sec-WebSocket-Version'] = '13'
+
+            return
+
+        key = request.headers.get('Sec-WebSocket-Key', '').strip()
+
+        try:
+            if len(b64decode(key, validate=True)) != 16:
+                raise ValueError(key)
+        except (BinasciiError, ValueError):
+            response.status_code = 400
+
+            return
+
+        protocol = self._select_protocol(request)
+        deflate = None
+
+        if self._compression_level is not None:
+            extensions = ', '.join(request.headers.getall('Sec-WebSocket-Extensions', ()))
+            deflate = _PerMessageDeflate._negotiate(extensions, self._compression_level) if extensions else None
+
+        response.status_code = 101
+        response.headers['Upgrade'] = 'websocket'
+        response.headers['Connection'] = 'Upgrade'
+        response.headers['Sec-WebSocket-Accept'] = b64encode(sha1(key.encode('ascii') + WEBSOCKET_GUID).digest()).decode('ascii')
+
+        if protocol is not None:
+            response.headers['Sec-WebSocket-Protocol'] = protocol
+
+        if deflate is not None:
+            response.headers['Sec-WebSocket-Extensions'] = deflate.response_header
+
+        await response._send_headers()
+        response._is_body_sent = True
+        # Connection belongs to WebSocket now, it is closed after handler returns.
+        # It is not in-flight request anymore, so it is not counted by max_requests.
+        request.keep_alive = False
+        connection.server._end_in_flight(request)
+
+        websocket = WebSocket(connection, protocol, deflate, self._max_message_length, self._compression_minimum_length)
+        keep_alive_task = await spawn(websocket._keep_alive, self._ping_interval, connection.server, daemon=True) if self._ping_interval else None
+
+        try:
+            await self.serve(request, websocket, **parameters)
+        finally:
+            if keep_alive_task is not None:
+                await keep_alive_task.cancel()
+
+        await websocket._finish(self._close_timeout)
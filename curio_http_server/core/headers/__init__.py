@@ -1,22 +1,57 @@
+from .specific import AcceptEncodingHeader
 from .specific import AuthorizationHeader
 from .specific import ContentDispositionHeader
 from .specific import ContentTypeHeader
+from .specific import ETagHeader
+from .specific import RangeHeader
 from .specific import UserAgentHeader
 from base64 import standard_b64decode
+from datetime import timezone
 from email.utils import format_datetime
 from email.utils import parsedate_to_datetime
 from multidict import CIMultiDict
 
 
+def _parse_http_date(value):
+    if value:
+        try:
+            result = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+
+        # "-0000" zone is parsed as naive datetime, HTTP dates are always UTC.
+        if result.tzinfo is None:
+            result = result.replace(tzinfo=timezone.utc)
+
+        return result
+
+    return None
+
+
+def _format_http_date(value):
+    if value.tzinfo:
+        return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+    return format_datetime(value)
+
+
 class BaseHeaders(CIMultiDict):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self._reset_attributes()
+
+    def _reset_attributes(self):
         self.content_disposition = None
         self.content_length = None
         self.content_md5 = None
         self.content_type = None
         self.date = None
 
+    def _reset(self):
+        # Headers are reused between requests of same connection.
+        self.clear()
+        self._reset_attributes()
+
 
 class FormPartHeaders(BaseHeaders):
     def __init__(self, *args, **kwargs):
@@ -41,17 +76,37 @@ class FormPartHeaders(BaseHeaders):
 
 
 class RequestHeaders(BaseHeaders):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    def _reset_attributes(self):
+        super()._reset_attributes()
+        self.accept_encoding = None
         self.authorization = None
-        self.user_agent = None
+        self.expect_continue = False
+        self.host = None
+        self.if_match = None
+        self.if_modified_since = None
+        self.if_none_match = None
+        self.if_range = None
+        self.if_unmodified_since = None
+        self.range = None
+        self._user_agent = None
+        self._is_user_agent_parsed = False
+
+    @property
+    def user_agent(self):
+        if not self._is_user_agent_parsed:
+            self._user_agent = UserAgentHeader._from_value(self.get('User-Agent'))
+            self._is_user_agent_parsed = True
+
+        return self._user_agent
 
     def _post_process(self, request):
         # TODO: A-IM
         # TODO: Accept
         # TODO: Accept-Charset
         # TODO: Accept-Datetime
-        # TODO: Accept-Encoding
+        # Accept-Encoding
+        self.accept_encoding = AcceptEncodingHeader._from_value(self.get('Accept-Encoding'))
+
         # TODO: Accept-Language
         # TODO: Access-Control-Request-Headers
         # TODO: Access-Control-Request-Method
@@ -98,7 +153,12 @@ class RequestHeaders(BaseHeaders):
         if date_value:
             self.date = parsedate_to_datetime(date_value)
 
-        # TODO: Expect
+        # Expect, only 100-continue is defined
+        expect_value = self.get('Expect')
+
+        if expect_value:
+            self.expect_continue = expect_value.strip().lower() == '100-continue'
+
         # TODO: Forwarded
         # TODO: From
         # Host
@@ -119,30 +179,51 @@ class RequestHeaders(BaseHeaders):
                 request.host = host_value
 
         # TODO: HTTP2-Settings
-        # TODO: If-Match
-        # TODO: If-Modified-Since
-        # TODO: If-None-Match
-        # TODO: If-Range
-        # TODO: If-Unmodified-Since
+        # If-Match
+        self.if_match = ETagHeader._from_list(self.get('If-Match'))
+
+        # If-Modified-Since
+        self.if_modified_since = _parse_http_date(self.get('If-Modified-Since'))
+
+        # If-None-Match
+        self.if_none_match = ETagHeader._from_list(self.get('If-None-Match'))
+
+        # If-Range, either entity tag or date
+        if_range_value = self.get('If-Range')
+
+        if if_range_value:
+            if_range_value = if_range_value.strip()
+
+            if if_range_value.startswith(('"', 'W/')):
+                if_range_tags = ETagHeader._from_list(if_range_value)
+                self.if_range = if_range_tags[0] if if_range_tags else None
+            else:
+                self.if_range = _parse_http_date(if_range_value)
+
+        # If-Unmodified-Since
+        self.if_unmodified_since = _parse_http_date(self.get('If-Unmodified-Since'))
+
         # TODO: Max-Forwards
         # TODO: Origin
         # TODO: Pragma
         # TODO: Proxy-Authorization
-        # TODO: Range
+        # Range
+        self.range = RangeHeader._from_value(self.get('Range'))
+
         # TODO: Referer
         # TODO: TE
         # TODO: Upgrade
-        # User-Agent
-        self.user_agent = UserAgentHeader._from_value(self.get('User-Agent'))
+        # User-Agent is parsed on first access, see user_agent property.
         # TODO: Via
         # TODO: Warning
 
 
 class ResponseHeaders(BaseHeaders):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    def _reset_attributes(self):
+        super()._reset_attributes()
         self.content_length = None
         self.content_type = None
+        self.etag = None
         self.last_modified = None
 
     def _post_process(self, response):
@@ -160,7 +241,7 @@ class ResponseHeaders(BaseHeaders):
         # TODO: Cache-Control
         # TODO: Connection
         # TODO: Content-Disposition
-        # TODO: Content-Encoding
+        # Content-Encoding is set by Response, see compression.
         # TODO: Content-Language
         # Content-Length
         if self.content_length:
@@ -173,14 +254,17 @@ class ResponseHeaders(BaseHeaders):
         if self.content_type:
             self['Content-Type'] = str(self.content_type)
 
-        # TODO: Date
+        # Date is added by Response, see _DateHeader.
         # TODO: Delta-Base
-        # TODO: ETag
+        # ETag
+        if self.etag:
+            self['ETag'] = str(self.etag)
+
         # TODO: Expires
         # TODO: IM
         # Last-Modified
         if self.last_modified:
-            self['Last-Modified'] = format_datetime(self.last_modified)
+            self['Last-Modified'] = _format_http_date(self.last_modified)
 
         # TODO: Link
         # TODO: Location
@@ -196,7 +280,7 @@ class ResponseHeaders(BaseHeaders):
         # TODO: Trailer
         # TODO: Transfer-Encoding
         # TODO: Upgrade
-        # TODO: Vary
+        # Vary is set by Response, see _add_vary.
         # TODO: Via
         # TODO: WWW-Authenticate
         # TODO: Warning
@@ -1,7 +1,61 @@
 from base64 import standard_b64decode
+from functools import lru_cache
+from re import compile
 from ua_parser import user_agent_parser
 
 
+etag_list_pattern = compile(r'(W/)?"([^"]*)"')
+
+
+class AcceptEncodingHeader(object):
+    __slots__ = 'codings', 'value'
+
+    @classmethod
+    def _from_value(cls, value):
+        if value is not None:
+            codings = {}
+
+            for part in value.split(','):
+                parts = part.split(';')
+                coding = parts[0].strip().lower()
+
+                if not coding:
+                    continue
+
+                quality = 1.0
+
+                for param in parts[1:]:
+                    if '=' in param:
+                        name, param_value = param.split('=', 1)
+
+                        if name.strip().lower() == 'q':
+                            try:
+                                quality = float(param_value)
+                            except ValueError:
+                                quality = 0.0
+
+                codings[coding] = quality
+
+            return cls(codings, value)
+
+        return None
+
+    def __init__(self, codings, value):
+        self.codings = codings
+        self.value = value
+
+    def get_quality(self, coding):
+        quality = self.codings.get(coding)
+
+        if quality is None:
+            quality = self.codings.get('*', 0.0)
+
+        return quality
+
+    def __str__(self):
+        return self.value
+
+
 class AuthorizationHeader(object):
     __slots__ = 'type', 'credentials', 'username', 'password', 'token', 'value'
 
@@ -88,6 +142,110 @@ class ContentTypeHeader(object):
         return self.value
 
 
+class ETagHeader(object):
+    __slots__ = 'tag', 'is_weak', 'value'
+
+    @classmethod
+    def _from_list(cls, value):
+        # If-Match and If-None-Match, "*" is represented as a single tag "*".
+        if value:
+            value = value.strip()
+
+            if value == '*':
+                return (cls('*'),)
+
+            return tuple(cls(tag, bool(weak)) for weak, tag in etag_list_pattern.findall(value))
+
+        return None
+
+    def __init__(self, tag, is_weak=False):
+        self.tag = tag
+        self.is_weak = is_weak
+
+        if tag == '*':
+            self.value = tag
+        elif is_weak:
+            self.value = f'W/"{tag}"'
+        else:
+            self.value = f'"{tag}"'
+
+    # other is None if representation has no entity tag, only "*" matches it.
+    def matches_strong(self, other):
+        if self.tag == '*':
+            return True
+
+        return (other is not None) and (not self.is_weak) and (not other.is_weak) and (self.tag == other.tag)
+
+    def matches_weak(self, other):
+        return (self.tag == '*') or ((other is not None) and (self.tag == other.tag))
+
+    def __str__(self):
+        return self.value
+
+
+class RangeHeader(object):
+    __slots__ = 'unit', 'ranges', 'value'
+
+    @classmethod
+    def _from_value(cls, value):
+        # Syntactically invalid header must be ignored, so None is returned.
+        if value and ('=' in value):
+            unit, ranges_value = value.split('=', 1)
+            ranges = []
+
+            for part in ranges_value.split(','):
+                part = part.strip()
+
+                if not part:
+                    continue
+
+                if '-' not in part:
+                    return None
+
+                start, end = part.split('-', 1)
+                start = start.strip()
+                end = end.strip()
+
+                if (start and not start.isdigit()) or (end and not end.isdigit()) or not (start or end):
+                    return None
+
+                start = int(start) if start else None
+                end = int(end) if end else None
+
+                if (start is not None) and (end is not None) and (start > end):
+                    return None
+
+                ranges.append((start, end))
+
+            if ranges:
+                return cls(unit.strip().lower(), tuple(ranges), value)
+
+        return None
+
+    def __init__(self, unit, ranges, value):
+        self.unit = unit
+        # (first, last) pairs, first is None for suffix ranges, last is None for open ranges.
+        self.ranges = ranges
+        self.value = value
+
+    def _resolve(self, length):
+        # Returns satisfiable (first, last) byte positions, empty tuple if none is satisfiable.
+        result = []
+
+        for first, last in self.ranges:
+            if first is None:
+                # Suffix of empty representation is not satisfiable, RFC 7233, section 2.1.
+                if (last > 0) and (length > 0):
+                    result.append((max(0, length - last), length - 1))
+            elif first < length:
+                result.append((first, length - 1 if last is None else min(last, length - 1)))
+
+        return tuple(result)
+
+    def __str__(self):
+        return self.value
+
+
 class _UserAgentBrowser(object):
     __slots__ = 'family', 'major', 'minor', 'patch'
 
@@ -157,7 +315,10 @@ class _UserAgentDevice(object):
 class UserAgentHeader(object):
     __slots__ = 'browser', 'operating_system', 'device', 'value'
 
+    # Parsing is expensive and clients send same few hundred values over and over again.
+    # Parsed instances are shared between requests, never modify them.
     @classmethod
+    @lru_cache(maxsize=1024)
     def _from_value(cls, value):
         if value:
             user_agent_data = user_agent_parser.Parse(value)
@@ -0,0 +1,77 @@
+from curio.io import Socket
+from os import chmod
+from os import environ
+from os import getpid
+from os import set_inheritable
+from os import stat
+from os import unlink
+from socket import AF_UNIX
+from socket import SOCK_STREAM
+from socket import socket
+from stat import S_ISSOCK
+
+
+# First file descriptor passed by systemd socket activation, see sd_listen_fds(3).
+LISTEN_FDS_START = 3
+
+
+def unix_server_socket(path, mode=0o660, backlog=1024):
+    # Socket file left by previous process is removed, any other file at path is never touched.
+    try:
+        if S_ISSOCK(stat(path).st_mode):
+            unlink(path)
+    except FileNotFoundError:
+        pass
+
+    sock = socket(AF_UNIX, SOCK_STREAM)
+
+    try:
+        sock.bind(path)
+
+        # Socket file is created with umask applied, mode limits which local users can connect.
+        if mode is not None:
+            chmod(path, mode)
+
+        sock.listen(backlog)
+    except Exception:
+        sock.close()
+        raise
+
+    return Socket(sock)
+
+
+def fd_server_socket(fd):
+    # Listening socket opened by parent process, family and type are detected by kernel.
+    sock = socket(fileno=fd)
+
+    if sock.type != SOCK_STREAM:
+        sock.detach()
+        raise ValueError('File descriptor {0} is not stream socket.'.format(fd))
+
+    return Socket(sock)
+
+
+def inherited_server_sockets(unset_environment=True):
+    # Sockets passed by systemd socket activation or compatible supervisor with LISTEN_PID and LISTEN_FDS.
+    # Environment is unset, so processes started by this one do not take the same sockets.
+    try:
+        if int(environ.get('LISTEN_PID', '0')) != getpid():
+            return []
+
+        count = int(environ.get('LISTEN_FDS', '0'))
+    except ValueError:
+        return []
+    finally:
+        if unset_environment:
+            environ.pop('LISTEN_PID', None)
+            environ.pop('LISTEN_FDS', None)
+            environ.pop('LISTEN_FDNAMES', None)
+
+    sockets = []
+
+    for fd in range(LISTEN_FDS_START, LISTEN_FDS_START + count):
+        # Inherited descriptors are not closed on exec, they must not leak into unrelated child processes.
+        set_inheritable(fd, False)
+        sockets.append(fd_server_socket(fd))
+
+    return sockets
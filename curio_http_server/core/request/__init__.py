@@ -3,7 +3,6 @@ from ..headers import RequestHeaders
 from email.message import Message
 from email.parser import BytesFeedParser
 from email.policy import HTTP
-from httptools import HttpRequestParser
 from httptools import parse_url
 from json import loads
 from multidict import CIMultiDict
@@ -20,7 +19,7 @@ class RequestBodyStream(object):
         return await self.request._read_body(max_length)
 
     async def readall(self):
-        body = b''
+        chunks = []
 
         while True:
             data = await self.request._read_body(64 * 1024)
@@ -28,9 +27,9 @@ class RequestBodyStream(object):
             if not data:
                 break
 
-            body += data
+            chunks.append(data)
 
-        return body
+        return b''.join(chunks)
 
 
 class RequestBodyStreamContext(object):
@@ -66,6 +65,13 @@ class RequestFilePart(object):
 
 
 class Request(object):
+    __slots__ = (
+        '_connection', '_parser', '_body_chunks', '_body_buffer_length', '_headers_complete', '_is_body_complete',
+        '_body_length', '_body_position', '_body', '_text', '_json', '_form', '_is_continue_pending', '_is_in_flight',
+        'version', 'keep_alive', 'upgrade', 'address', 'raw_method', 'raw_headers', 'raw_query', 'raw_path',
+        'method', 'host', 'port', 'headers', 'query', 'cookies', 'path',
+        'content_type_main', 'content_type_sub', 'content_type_params', 'content_charset', 'context')
+
     def on_message_begin(self):
         pass
 
@@ -100,10 +106,19 @@ class Request(object):
         if self.headers.content_length:
             self._body_length = self.headers.content_length
 
+        # Client waits for 100 Continue before sending body, it is sent only when handler reads body, see _read_body.
+        # HTTP/1.0 client must not receive it, RFC 7231, section 5.1.1.
+        self._is_continue_pending = self.headers.expect_continue and (self.version != '1.0')
+
     def on_body(self, body: bytes):
-        self._body_buffer += body
+        # Client did not wait for 100 Continue.
+        self._is_continue_pending = False
+        self._body_chunks.append(body)
+        self._body_buffer_length += len(body)
+        self._body_position += len(body)
 
     def on_message_complete(self):
+        self._is_continue_pending = False
         self._is_body_complete = True
 
     def on_chunk_header(self):
@@ -112,70 +127,104 @@ class Request(object):
     def on_chunk_complete(self):
         pass
 
-    async def _try_read_headers(self):
-        while not self._headers_complete:
-            data = await self._connection.read_request(64 * 1024)
-
-            if not data:
-                return False
+    def _pop_body_chunks(self):
+        if len(self._body_chunks) == 1:
+            result = self._body_chunks[0]
+        else:
+            result = b''.join(self._body_chunks)
 
-            self._parser.feed_data(data)
+        self._body_chunks = []
+        self._body_buffer_length = 0
 
-        return True
+        return result
 
     async def _read_body(self, max_length=64*1024):
-        while (not self._is_body_complete) or (len(self._body_buffer) > 0):
-            chunk_length = min(max_length, self._body_length - (self._body_position + len(self._body_buffer))) 
-            data = await self._connection.read_request(chunk_length)
+        while (not self._is_body_complete) or (self._body_buffer_length > 0):
+            if self._body_buffer_length > 0:
+                return self._pop_body_chunks()
 
-            if not data:
-                self._is_body_complete = True
-            else:
-                self._body_position += len(data)
-                self._parser.feed_data(data)
+            if self._is_continue_pending:
+                self._is_continue_pending = False
+                await self._connection._send_continue()
+
+            chunk_length = min(max_length, self._body_length - self._body_position)
+
+            # Slow client raises TaskTimeout, incomplete body is never passed to handler as complete one.
+            async with self._connection.timeout(self._connection.server.body_timeout):
+                data = await self._connection.read_request_into(chunk_length)
+
+            if (not data) and self._is_body_complete:
+                # End of HTTP/2 stream, see Stream20.read_request_into.
+                break
+
+            if (not data) or (not self._connection._feed_data(data)):
+                # Client is gone or sent garbage, connection cannot be reused.
+                self.keep_alive = False
+
+                raise EOFError('Request body is incomplete.')
 
             if self._body_position == self._body_length:
                 self._is_body_complete = True
 
-            if len(self._body_buffer) > 0:
-                result = self._body_buffer
-                self._body_buffer = b''
+        return b''
 
-                return result
+    async def _discard_body(self, max_length):
+        # Unread body must be consumed before next request on same connection, returns False if it is too long.
+        # Body which was never requested with 100 Continue may never come, so connection cannot be reused.
+        if self._is_continue_pending:
+            return False
 
-        return b''
+        while await self._read_body():
+            if self._body_position > max_length:
+                return False
+
+        return self.keep_alive
 
     def __init__(self, connection):
+        # Created by connection when new message begins, parser is shared by all requests of connection.
         self._connection = connection
-        self._parser = HttpRequestParser(self)
-        self._body_buffer = b''
+        self._parser = connection._parser
+        self.address = connection.address
+        self.raw_headers = CIMultiDict()
+        self.raw_query = CIMultiDict()
+        self.headers = RequestHeaders()
+        self.query = CIMultiDict()
+        self.reset()
+
+    def reset(self):
+        # Connection reuses request objects, so do not keep references to request after response is sent.
+        self._body_chunks = []
+        self._body_buffer_length = 0
         self._headers_complete = False
         self._is_body_complete = False
+        self._is_continue_pending = False
+        # Counted by Server11.requests_count.
+        self._is_in_flight = False
 
         self.version = None
         self.keep_alive = None
         self.upgrade = None
-        self.address = connection.address
         self.raw_method = b''
-        self.raw_headers = CIMultiDict()
-        self.raw_query = CIMultiDict()
+        self.raw_headers.clear()
+        self.raw_query.clear()
         self.raw_path = b''
 
         self.method = ''
         self.host = 'localhost'
         self.port = 80
-        self.headers = RequestHeaders()
-        self.query = CIMultiDict()
+        self.headers._reset()
+        self.query.clear()
         self.cookies = {}
         self.path = ''
         self.content_type_main = 'application'
         self.content_type_sub = 'octet-stream'
         self.content_type_params = {}
         self.content_charset = 'ascii'
+        # Arbitrary data of middlewares and handlers.
+        self.context = {}
 
         self._body_length = 2**32
         self._body_position = 0
-        self._is_body_complete = False
         self._body = None
         self._text = None
         self._json = None
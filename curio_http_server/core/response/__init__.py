@@ -1,5 +1,14 @@
+from ..events import format_event
+from ..headers import ContentTypeHeader
+from ..headers import ETagHeader
 from ..headers import ResponseHeaders
+from datetime import timezone
+from email.utils import formatdate
+from hashlib import blake2b
 from json import dumps
+from os import fstat
+from time import time
+from uuid import uuid4
 
 
 STATUS_DATA = {
@@ -69,62 +78,403 @@ STATUS_DATA = {
 
 
 STATUS_TEXT = { code: data.decode('ascii') for code, data in STATUS_DATA.items() }
+# (version, status code) -> status line, only for standard status texts.
+STATUS_LINES = {}
+
+
+class _DateHeader(object):
+    # Same Date header is shared by all responses sent within one second.
+    __slots__ = 'timestamp', 'value', 'data'
+
+    def __init__(self):
+        self.timestamp = None
+        self.value = None
+        self.data = None
+
+    def _update(self):
+        timestamp = int(time())
+
+        if timestamp != self.timestamp:
+            self.timestamp = timestamp
+            self.value = formatdate(timestamp, usegmt=True).encode('ascii')
+            self.data = b'Date: %b\r\n' % self.value
+
+    def get_value(self):
+        self._update()
+
+        return self.value
+
+    def get_data(self):
+        self._update()
+
+        return self.data
+
+
+_date_header = _DateHeader()
+
+
+def _get_status_line(version, status_code, status_text):
+    if status_text != STATUS_TEXT.get(status_code):
+        return b'HTTP/%s %03d %s\r\n' % (version.encode('ascii'), status_code, status_text.encode('ascii'))
+
+    status_line = STATUS_LINES.get((version, status_code))
+
+    if status_line is None:
+        status_line = b'HTTP/%s %03d %s\r\n' % (version.encode('ascii'), status_code, status_text.encode('ascii'))
+        STATUS_LINES[(version, status_code)] = status_line
+
+    return status_line
+
+
+def _format_header_line(name, value):
+    if type(value) is str:
+        value = value.encode('ascii')
+
+    return b'%b: %b\r\n' % (name.encode('ascii'), value)
+
+
+class PreparedHeaders(object):
+    # Headers serialized once and sent with every response, e.g. default headers of server.
+    # Response headers with same name take precedence.
+    __slots__ = 'items', 'names', 'data'
+
+    def __init__(self, headers):
+        self.items = tuple((name, value) for name, value in headers)
+        self.names = frozenset(name.lower() for name, _ in self.items)
+        self.data = b''.join(_format_header_line(name, value) for name, value in self.items)
+
+
+# Serving many small ranges is expensive and may be abused, whole file is sent instead.
+MAX_BYTE_RANGES = 32
 
 
 class ResponseBodyStream(object):
-    def __init__(self, response):
+    # Writes shorter than buffer_size are accumulated and sent as one chunk on flush.
+    # Zero buffer_size sends every write as a separate chunk immediately.
+    def __init__(self, response, buffer_size=0):
         self.response = response
+        self.buffer_size = buffer_size
+        self._buffer = bytearray()
+
+    async def _write_chunk(self, data, is_last=False):
+        # Pending headers, size line, data and trailing CRLF are sent with one system call.
+        buffers = [self.response._get_headers_data()]
+
+        if self.response._connection.is_framed:
+            # Connection frames body itself, end of body is signalled by connection when response is complete.
+            buffers.append(data)
+        elif data:
+            buffers += [b'%x\r\n' % len(data), data, b'\r\n0\r\n\r\n' if is_last else b'\r\n']
+        elif is_last:
+            buffers.append(b'0\r\n\r\n')
+
+        await self.response._connection.write_response_vector(buffers)
 
     async def write(self, data):
-        await self.response._send_headers()
-        await self.response._connection.write_response(b'%x\r\n' % len(data))
-        await self.response._connection.write_response(data)
-        await self.response._connection.write_response(b'\r\n')
+        # Empty write only sends pending headers, body is terminated by close.
+        if not data:
+            await self.response._send_headers()
+
+            return
+
+        if (not self._buffer) and (len(data) >= self.buffer_size):
+            if self.response._stream_compressor:
+                data = self.response._stream_compressor.compress(data)
+
+            await self._write_chunk(data)
+        else:
+            self._buffer += data
+
+            if len(self._buffer) >= self.buffer_size:
+                await self.flush()
+
+    async def flush(self):
+        if not self._buffer:
+            await self.response._send_headers()
+        else:
+            data = bytes(self._buffer)
+            self._buffer.clear()
+
+            if self.response._stream_compressor:
+                data = self.response._stream_compressor.compress(data)
+
+            await self._write_chunk(data)
 
     async def close(self):
-        await self.response._connection.write_response(b'0\r\n\r\n')
+        data = bytes(self._buffer)
+        self._buffer.clear()
+
+        if self.response._stream_compressor:
+            data = self.response._stream_compressor.finish(data)
+
+        await self._write_chunk(data, True)
+
+
+class EventStream(ResponseBodyStream):
+    # Server-sent events, see Response.open_event_stream.
+    async def send(self, data, event=None, id=None, retry=None):
+        await self.write(format_event(data, event, id, retry))
+
+    async def send_prepared(self, events):
+        # Events formatted with events.format_event are sent as one chunk without copying them.
+        if self._buffer:
+            await self.flush()
+
+        if len(events) == 1:
+            await self.write(events[0])
+        elif events:
+            response = self.response
+            length = sum(len(event) for event in events)
+            buffers = [response._get_headers_data()]
+
+            if response._connection.is_framed:
+                buffers += events
+            else:
+                buffers.append(b'%x\r\n' % length)
+                buffers += events
+                buffers.append(b'\r\n')
+
+            await response._connection.write_response_vector(buffers)
 
 
 class ResponseBodyStreamContext(object):
-    def __init__(self, response):
+    stream_class = ResponseBodyStream
+
+    def __init__(self, response, buffer_size=0):
         self.response = response
-        self.stream = ResponseBodyStream(self.response)
+        self.stream = self.stream_class(self.response, buffer_size)
 
     async def __aenter__(self):
         return self.stream
 
     async def __aexit__(self, exc_type, exc, tb):
-        await self.stream.close()
+        # Incomplete body must not be terminated as if it was complete, connection is closed instead.
+        if exc_type is None:
+            await self.stream.close()
+
+
+class EventStreamContext(ResponseBodyStreamContext):
+    stream_class = EventStream
+
+    async def __aenter__(self):
+        # Client waits for headers before it considers stream open, they are not delayed until first event.
+        await self.response._send_headers()
+
+        return self.stream
 
 
 class Response(object):
-    async def _send_headers(self):
-        if not self._are_headers_sent:
-            self._are_headers_sent = True
+    __slots__ = (
+        '_connection', '_version', '_request', '_compression', '_stream_compressor', '_are_headers_sent', '_is_body_sent',
+        '_status_code', '_status_text', '_prepared_headers', 'hash_etag', 'headers')
 
-            self.headers._post_process(self)
+    def _get_headers_data(self):
+        # Serialized headers, empty if headers are already sent. Caller must send them.
+        if self._are_headers_sent:
+            return b''
 
-            lines = [
-                b'HTTP/%s %03d %s\r\n' % (self._version.encode('ascii'), self.status_code, self.status_text.encode('ascii'))
-            ]
+        self._are_headers_sent = True
+
+        request = self._request
+
+        if (request is not None) and request._is_continue_pending and request.keep_alive:
+            # Client is still waiting for 100 Continue, body is not going to be read, so connection is closed.
+            request.keep_alive = False
+            self.headers['Connection'] = 'close'
+        elif (not self._connection.is_framed) and self._connection.server.is_shutting_down and ('Connection' not in self.headers):
+            # Keep-alive client is asked to reconnect, so it does not send next request to server which is going away.
+            # Checked when headers are sent, not when request starts, request may be in flight when shutdown begins.
+            if request is not None:
+                request.keep_alive = False
+
+            self.headers['Connection'] = 'close'
+
+        self.headers._post_process(self)
+
+        if self._connection.is_framed:
+            self._connection._set_headers(self.status_code, self._get_header_items())
+
+            return b''
+
+        lines = [_get_status_line(self._version, self.status_code, self.status_text)]
+
+        if self._is_date_missing():
+            lines.append(_date_header.get_data())
+
+        prepared_headers = self._prepared_headers
+
+        if prepared_headers is not None:
+            if any(name.lower() in prepared_headers.names for name in self.headers.keys()):
+                names = frozenset(name.lower() for name in self.headers.keys())
+                lines += [_format_header_line(name, value) for name, value in prepared_headers.items if name.lower() not in names]
+            else:
+                lines.append(prepared_headers.data)
+
+        for name, value in self.headers.items():
+            lines.append(_format_header_line(name, value))
+
+        lines.append(b'\r\n')
+
+        return b''.join(lines)
+
+    def _is_date_missing(self):
+        # Cached Date is sent unless handler or default headers set their own.
+        if 'Date' in self.headers:
+            return False
+
+        return (self._prepared_headers is None) or ('date' not in self._prepared_headers.names)
 
-            for name, value in self.headers.items():
-                name = name.encode('ascii')
+    def _get_header_items(self):
+        # Same headers as in _get_headers_data, but as list of pairs for connections which encode headers themselves.
+        items = []
 
-                if type(value) is str:
-                    value = value.encode('ascii')
+        if self._is_date_missing():
+            items.append(('Date', _date_header.get_value()))
 
-                lines.append(b'%b: %b\r\n' % (name, value))
+        if self._prepared_headers is not None:
+            names = frozenset(name.lower() for name in self.headers.keys())
+            items += [(name, value) for name, value in self._prepared_headers.items if name.lower() not in names]
 
-            lines.append(b'\r\n')
+        items += self.headers.items()
 
-            await self._connection.write_response(b''.join(lines))
+        return items
+
+    async def _send_headers(self):
+        if not self._are_headers_sent:
+            await self._connection.write_response(self._get_headers_data())
 
     async def _send_body(self, data):
         if not self._is_body_sent:
             self._is_body_sent = True
             await self._connection.write_response(data)
 
+    def _get_precondition_status_code(self):
+        # RFC 7232, section 6. Only successful GET and HEAD responses are checked, after handler has run, so handlers of
+        # unsafe methods must evaluate preconditions themselves before changing anything.
+        # Conditions are ignored if response has no matching validator, "*" matches any successful response.
+        if (self._request is None) or (self._request.method not in ('GET', 'HEAD')) or not (200 <= self._status_code < 300):
+            return None
+
+        request_headers = self._request.headers
+        etag = self.headers.etag
+        last_modified = self.headers.last_modified
+
+        if last_modified:
+            # HTTP dates have one second resolution.
+            last_modified = last_modified.astimezone(timezone.utc).replace(microsecond=0)
+
+        if request_headers.if_match is not None:
+            if (etag is not None) and not any(tag.matches_strong(etag) for tag in request_headers.if_match):
+                return 412
+        elif request_headers.if_unmodified_since and last_modified:
+            if last_modified > request_headers.if_unmodified_since:
+                return 412
+
+        if request_headers.if_none_match is not None:
+            if any(tag.matches_weak(etag) for tag in request_headers.if_none_match):
+                return 304
+        elif request_headers.if_modified_since and last_modified:
+            if last_modified <= request_headers.if_modified_since:
+                return 304
+
+        return None
+
+    def _get_byte_ranges(self, length):
+        # RFC 7233, returns None if whole representation should be sent.
+        if (self._request is None) or (self._status_code != 200) or (self._request.method != 'GET'):
+            return None
+
+        request_headers = self._request.headers
+
+        if (request_headers.range is None) or (request_headers.range.unit != 'bytes'):
+            return None
+
+        if len(request_headers.range.ranges) > MAX_BYTE_RANGES:
+            return None
+
+        if_range = request_headers.if_range
+
+        if if_range is not None:
+            if isinstance(if_range, ETagHeader):
+                if (self.headers.etag is None) or not if_range.matches_strong(self.headers.etag):
+                    return None
+            else:
+                last_modified = self.headers.last_modified
+
+                if (last_modified is None) or (last_modified.astimezone(timezone.utc).replace(microsecond=0) != if_range):
+                    return None
+
+        return request_headers.range._resolve(length)
+
+    def _add_vary(self, name):
+        vary_value = self.headers.get('Vary')
+
+        if not vary_value:
+            self.headers['Vary'] = name
+        elif vary_value.strip() != '*':
+            if name.lower() not in (part.strip().lower() for part in vary_value.split(',')):
+                self.headers['Vary'] = f'{vary_value}, {name}'
+
+    def _select_compressor(self, length=None):
+        # Length is None for streaming responses, which are always compressed if possible.
+        compression = self._compression
+
+        if (compression is None) or (self._request is None):
+            return None
+
+        if not (200 <= self._status_code < 300) or (self._status_code in (204, 206)):
+            return None
+
+        if 'Content-Encoding' in self.headers:
+            return None
+
+        content_type = str(self.headers.content_type) if self.headers.content_type else self.headers.get('Content-Type')
+
+        if not compression.is_compressible(content_type):
+            return None
+
+        self._add_vary('Accept-Encoding')
+
+        if (length is not None) and (length < compression.minimum_length):
+            return None
+
+        encoding = compression.select_encoding(self._request.headers.accept_encoding)
+
+        if encoding is None:
+            return None
+
+        self.headers['Content-Encoding'] = encoding
+
+        if self.headers.etag is not None:
+            # Every encoding is separate representation with its own entity tag.
+            self.headers.etag = ETagHeader(f'{self.headers.etag.tag}-{encoding}', self.headers.etag.is_weak)
+
+        return compression.create_compressor(encoding)
+
+    async def _try_send_precondition_result(self):
+        if self._are_headers_sent:
+            return False
+
+        status_code = self._get_precondition_status_code()
+
+        if status_code is None:
+            return False
+
+        self.status_code = status_code
+        self.headers.content_length = None
+
+        for name in ('Content-Length', 'Transfer-Encoding'):
+            self.headers.popall(name, None)
+
+        if status_code != 304:
+            # 304 never has body, other statuses need explicit empty one.
+            self.headers['Content-Length'] = '0'
+
+        await self._send_headers()
+        self._is_body_sent = True
+
+        return True
+
     def _get_status_code(self):
         return self._status_code
 
@@ -142,16 +492,29 @@ class Response(object):
     def _set_status_text(self, value):
         self._status_text = value
 
-    def __init__(self, connection, version, status_code=200, status_text=None, headers=None):
+    def __init__(self, connection, version, status_code=200, status_text=None, headers=None, request=None, hash_etag=False, compression=None):
         self._connection = connection
+        self.headers = ResponseHeaders()
+        self.reset(version, status_code, status_text, headers, request, hash_etag, compression)
+
+    def reset(self, version, status_code=200, status_text=None, headers=None, request=None, hash_etag=False, compression=None):
+        # Connection reuses response objects, so do not keep references to response after it is sent.
         self._version = version
+        self._request = request
+        self._compression = compression
+        self._stream_compressor = None
+        # Generate ETag from body hash for buffered responses without explicit ETag.
+        self.hash_etag = hash_etag
         self._are_headers_sent = False
         self._is_body_sent = False
         self._status_code = status_code
         self._status_text = status_text
-        self.headers = ResponseHeaders()
+        self.headers._reset()
+        self._prepared_headers = None
 
-        if headers:
+        if type(headers) is PreparedHeaders:
+            self._prepared_headers = headers
+        elif headers:
             for name, value in headers:
                 self.headers[name] = value
 
@@ -159,10 +522,110 @@ class Response(object):
     status_text = property(_get_status_text, _set_status_text)
 
     async def send_body(self, data):
+        if self.hash_etag and (self.headers.etag is None) and (200 <= self._status_code < 300):
+            self.headers.etag = ETagHeader(blake2b(data, digest_size=16).hexdigest())
+
+        compressor = self._select_compressor(len(data))
+
+        if await self._try_send_precondition_result():
+            return
+
+        if compressor:
+            data = compressor.finish(data)
+
         self.headers['Content-Length'] = str(len(data))
 
-        await self._send_headers()
-        await self._send_body(data)
+        if not self._is_body_sent:
+            self._is_body_sent = True
+            # Headers and body are sent with one system call.
+            await self._connection.write_response_vector((self._get_headers_data(), data))
+        else:
+            await self._send_headers()
+
+    async def _send_ranges(self, length, write_range):
+        # write_range(offset, length, prefix) writes prefix followed by part of representation.
+        if await self._try_send_precondition_result():
+            return
+
+        self.headers['Accept-Ranges'] = 'bytes'
+        byte_ranges = self._get_byte_ranges(length)
+
+        if byte_ranges is None:
+            self.headers['Content-Length'] = str(length)
+
+            if not self._is_body_sent:
+                self._is_body_sent = True
+                await write_range(0, length, self._get_headers_data())
+            else:
+                await self._send_headers()
+        elif not byte_ranges:
+            self.status_code = 416
+            self.headers['Content-Range'] = f'bytes */{length}'
+            self.headers['Content-Length'] = '0'
+
+            await self._send_headers()
+            self._is_body_sent = True
+        elif len(byte_ranges) == 1:
+            first, last = byte_ranges[0]
+            self.status_code = 206
+            self.headers['Content-Range'] = f'bytes {first}-{last}/{length}'
+            self.headers['Content-Length'] = str(last - first + 1)
+
+            if not self._is_body_sent:
+                self._is_body_sent = True
+                await write_range(first, last - first + 1, self._get_headers_data())
+            else:
+                await self._send_headers()
+        else:
+            boundary = uuid4().hex
+            part_content_type = str(self.headers.content_type) if self.headers.content_type else self.headers.get('Content-Type', 'application/octet-stream')
+            part_headers = [
+                b'\r\n--%b\r\nContent-Type: %b\r\nContent-Range: bytes %d-%d/%d\r\n\r\n' % (
+                    boundary.encode('ascii'), part_content_type.encode('ascii'), first, last, length)
+                for first, last in byte_ranges
+            ]
+            closing_boundary = b'\r\n--%b--\r\n' % boundary.encode('ascii')
+            content_length = sum(len(part_header) for part_header in part_headers) + len(closing_boundary)
+            content_length += sum(last - first + 1 for first, last in byte_ranges)
+
+            self.status_code = 206
+            self.headers.content_type = ContentTypeHeader('multipart', 'byteranges', params={'boundary': boundary})
+            self.headers['Content-Length'] = str(content_length)
+
+            if not self._is_body_sent:
+                self._is_body_sent = True
+                prefix = self._get_headers_data()
+
+                for part_header, (first, last) in zip(part_headers, byte_ranges):
+                    await write_range(first, last - first + 1, prefix + part_header)
+                    prefix = b''
+
+                await self._connection.write_response(closing_boundary)
+            else:
+                await self._send_headers()
+
+    async def send_file(self, file, offset=0, length=None, chunk_length=64*1024, run_blocking=None):
+        # File must be opened in binary mode. Data is sent with sendfile when possible.
+        # run_blocking(function, *args) executes blocking file reads when sendfile is not used, see Connection11.write_file.
+        if length is None:
+            length = fstat(file.fileno()).st_size - offset
+
+        async def write_range(range_offset, range_length, prefix):
+            if prefix:
+                await self._connection.write_response(prefix)
+
+            await self._connection.write_file(file, offset + range_offset, range_length, chunk_length, run_blocking)
+
+        await self._send_ranges(length, write_range)
+
+    async def send_buffer(self, data):
+        # Same as send_file, but for data already in memory. Ranges are supported, data is never compressed.
+        data = memoryview(data)
+
+        async def write_range(range_offset, range_length, prefix):
+            await self._connection.write_response_vector((prefix, data[range_offset:range_offset + range_length]))
+
+        await self._send_ranges(len(data), write_range)
 
     async def send_text(self, text):
         if not 'Content-Type' in self.headers:
@@ -182,13 +645,29 @@ class Response(object):
 
         await self.send_text(dumps(json, *args, **kwargs))
 
-    def open_body(self):
+    def _open_stream(self):
         try:
             del self.headers['Content-Length']
         except KeyError:
             pass
 
-        self.headers['Transfer-Encoding'] = b'chunked'
+        if not self._connection.is_framed:
+            self.headers['Transfer-Encoding'] = b'chunked'
+
         self._is_body_sent = True
 
-        return ResponseBodyStreamContext(self)
+    def open_body(self, buffer_size=0):
+        self._open_stream()
+        self._stream_compressor = self._select_compressor()
+
+        return ResponseBodyStreamContext(self, buffer_size)
+
+    def open_event_stream(self, buffer_size=0):
+        # Events are not compressed, so event formatted once can be sent to many clients, see events.EventHub.
+        self.headers['Content-Type'] = 'text/event-stream'
+        self.headers['Cache-Control'] = 'no-cache'
+        # Reverse proxies, e.g. nginx, must not buffer events.
+        self.headers['X-Accel-Buffering'] = 'no'
+        self._open_stream()
+
+        return EventStreamContext(self, buffer_size)
@@ -5,6 +5,9 @@ from uuid import UUID
 
 
 url_parameter_pattern = compile(r'<(?P<name>[A-Za-z0-9_]+?)(?:\:(?P<pattern>.+?))?>')
+# Parameters of these types never match "/", so they can be matched segment by segment.
+url_segment_parameter_types = frozenset((None, 'str', 'slug', 'int', 'uuid'))
+url_regexp_characters = frozenset('.^$*+?{}[]\\|()')
 
 
 class Route(object):
@@ -48,6 +51,7 @@ class Route(object):
         return f'<{name}>'
 
     def __init__(self, path_pattern, method_handlers):
+        self.index = None
         self.method_handlers = {}
 
         for name, handler in method_handlers.items():
@@ -84,9 +88,89 @@ class Route(object):
         self.method_handlers.update(new_route.method_handlers)
 
 
+class _RouteNode(object):
+    __slots__ = 'static_children', 'dynamic_children', 'routes', 'tail_routes'
+
+    def __init__(self):
+        # Segment text -> node
+        self.static_children = {}
+        # Segment pattern -> (compiled segment regexp, node)
+        self.dynamic_children = {}
+        # Routes ending exactly at this node
+        self.routes = []
+        # (compiled regexp of the remaining path, route) for routes with path or custom parameters
+        self.tail_routes = []
+
+    def add(self, route):
+        path_pattern = route.path_pattern
+        tail_pattern = None
+
+        for match in url_parameter_pattern.finditer(path_pattern):
+            if match.group('pattern') not in url_segment_parameter_types:
+                split_position = path_pattern.rfind('/', 0, match.start()) + 1
+                tail_pattern = path_pattern[split_position:]
+                path_pattern = path_pattern[:split_position]
+                break
+
+        segment_patterns = path_pattern.split('/')
+
+        if tail_pattern is not None:
+            # Path pattern ends with "/" here, last segment is always empty.
+            segment_patterns.pop()
+
+        node = self
+
+        for segment_pattern in segment_patterns:
+            if url_parameter_pattern.search(segment_pattern) or (url_regexp_characters & set(segment_pattern)):
+                child = node.dynamic_children.get(segment_pattern)
+
+                if child is None:
+                    segment_regexp = compile(url_parameter_pattern.sub(route._add_parameter_converter, segment_pattern))
+                    child = node.dynamic_children[segment_pattern] = (segment_regexp, _RouteNode())
+
+                node = child[1]
+            else:
+                node = node.static_children.setdefault(segment_pattern, _RouteNode())
+
+        if tail_pattern is None:
+            node.routes.append(route)
+        else:
+            tail_regexp = compile(url_parameter_pattern.sub(route._add_parameter_converter, tail_pattern))
+            node.tail_routes.append((tail_regexp, route))
+
+    def match(self, segments, depth, parameters, results):
+        if depth == len(segments):
+            for route in self.routes:
+                results.append((route, parameters))
+
+            return
+
+        if self.tail_routes:
+            tail = '/'.join(segments[depth:])
+
+            for tail_regexp, route in self.tail_routes:
+                match = tail_regexp.fullmatch(tail)
+
+                if match:
+                    results.append((route, {**parameters, **match.groupdict()}))
+
+        segment = segments[depth]
+        child = self.static_children.get(segment)
+
+        if child is not None:
+            child.match(segments, depth + 1, parameters, results)
+
+        for segment_regexp, child in self.dynamic_children.values():
+            match = segment_regexp.fullmatch(segment)
+
+            if match:
+                child.match(segments, depth + 1, {**parameters, **match.groupdict()}, results)
+
+
 class Router(object):
     def __init__(self):
         self.routes = {}
+        self._root = _RouteNode()
 
     def _add_functions(self, path_pattern, method_handlers):
         new_route = Route(path_pattern, method_handlers)
@@ -98,7 +182,9 @@ class Router(object):
 
             old_route.merge(new_route)
         else:
+            new_route.index = len(self.routes)
             self.routes[new_route.identifier] = new_route
+            self._root.add(new_route)
 
     def _add_object(self, path_pattern, handler, method_names):
         method_handlers = {}
@@ -140,18 +226,29 @@ class Router(object):
 
     def match(self, path, method_name):
         method_name = method_name.lower()
-        final_result = 404
-        final_handler = None
+        matches = []
+
+        self._root.match(path.split('/'), 0, {}, matches)
+
+        if not matches:
+            return 404, None, None
+
+        final_route = None
         final_parameters = None
 
-        for route in self.routes.values():
-            result, handler, parameters = route.match(path, method_name)
+        # Several patterns may match same path, the latest added one wins.
+        for route, parameters in matches:
+            if method_name in route.method_handlers:
+                if (final_route is None) or (route.index > final_route.index):
+                    final_route = route
+                    final_parameters = parameters
+
+        if final_route is None:
+            return 405, None, None
+
+        path_parameters = {}
 
-            if result < 300:
-                final_result = result
-                final_handler = handler
-                final_parameters = parameters
-            elif result == 405:
-                final_result = result
+        for name, converter in final_route.parameter_converters.items():
+            path_parameters[name] = converter(final_parameters[name])
 
-        return final_result, final_handler, final_parameters
\ No newline at end of file
+        return 200, final_route.method_handlers[method_name], path_parameters
\ No newline at end of file
@@ -1,14 +1,134 @@
 from ..request import Request
+from ..response import PreparedHeaders
 from ..response import Response
+from ..tls import TLSMetrics
+from curio import CancelledError
+from curio import Event
 from curio import TaskTimeout
-from curio import tcp_server
+from curio import current_task
+from curio import run
+from curio import sleep as async_sleep
+from curio import spawn
 from curio import timeout_after
+from curio.io import Socket
+from curio.network import tcp_server_socket
+from collections import deque
+from errno import ECONNABORTED
+from errno import EMFILE
+from errno import ENFILE
+from errno import ENOBUFS
+from errno import ENOMEM
+from curio.traps import _write_wait
+from httptools import HttpParserError
+from httptools import HttpParserUpgrade
+from httptools import HttpRequestParser
 from html import escape
+from os import _exit
+from os import close
+from os import cpu_count
+from os import fork
+from os import kill
+from os import pipe
+from os import read
+from os import set_blocking
+from os import waitpid
+from os import WNOHANG
+from signal import SIG_DFL
+from signal import SIG_IGN
+from signal import SIGCHLD
+from signal import SIGHUP
+from signal import SIGINT
+from signal import SIGTERM
+from signal import set_wakeup_fd
+from signal import signal
+from socket import IPPROTO_TCP
 from socket import SHUT_RDWR
+from socket import TCP_NODELAY
+from select import select
+from ssl import SSLSocket
+from time import monotonic
 from traceback import format_exc
+from traceback import print_exc
+
+try:
+    from os import sendfile
+except ImportError:
+    sendfile = None
+
+
+# Buffers are joined to be sent with one call if sendmsg is not available, e.g. with TLS.
+MAX_JOINED_LENGTH = 64 * 1024
+# Conservative IOV_MAX.
+MAX_VECTOR_LENGTH = 1024
+# Receive buffer is held by every connection, including idle ones, so it fits common request headers and one TLS record.
+RECEIVE_BUFFER_LENGTH = 16 * 1024
+# Accept errors which go away when other connections are closed, e.g. too many open files, accept is retried after delay.
+ACCEPT_RETRY_ERRORS = frozenset((ECONNABORTED, EMFILE, ENFILE, ENOBUFS, ENOMEM))
+ACCEPT_RETRY_DELAY = 0.1
+
+
+class CoarseTimeouts(object):
+    # Timeouts shared by all connections. Deadlines are rounded up to resolution, so timeouts expiring in the same
+    # tick are delivered by single kernel wakeup. Timeouts are curio timeouts of current task, they nest with
+    # timeout_after and ignore_after of handlers and never touch cancellation state of task.
+    def __init__(self, resolution=1.0):
+        self.resolution = resolution
+
+    def timeout(self, timeout):
+        # Raises TaskTimeout in guarded block, like curio.timeout_after. Disabled if timeout is None or 0.
+        if not timeout:
+            return _NO_TIMEOUT
+
+        now = monotonic()
+        deadline = (int((now + timeout) / self.resolution) + 1) * self.resolution
+
+        return timeout_after(deadline - now)
+
+
+class LoopLagMonitor(object):
+    # Measures how busy event loop is, by how late task which sleeps for interval seconds wakes up.
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self._task = None
+        # How late the last wakeup was.
+        self.lag = 0.0
+
+    async def _run(self):
+        while True:
+            expected_time = monotonic() + self.interval
+            await async_sleep(self.interval)
+            self.lag = max(0.0, monotonic() - expected_time)
+
+    async def start(self):
+        if self._task is None:
+            self._task = await spawn(self._run, daemon=True)
+
+
+class _NoTimeout(object):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_TIMEOUT = _NoTimeout()
+
+
+def _ignore_signal(signal_number, frame):
+    # Installed instead of SIG_IGN, signal is still written to wakeup fd.
+    pass
 
 
 class Connection11(object):
+    # Messages are delimited by Content-Length or chunked coding, see Stream20 for connection which frames messages itself.
+    is_framed = False
+
+    __slots__ = (
+        'socket', 'server', 'request', 'address', 'match_result', 'match_handler', 'match_parameters', 'task', 'requests_count',
+        'can_sendfile', 'can_sendmsg', 'is_idle', 'is_tls', 'upgrade_data', 'alpn_protocol', 'tls_handshake_time',
+        '_parser', '_parsing_request', '_ready_requests', '_is_parser_broken', '_free_requests', '_response', '_receive_view')
+
     def __init__(self, socket, address, server):
         self.socket = socket
         self.server = server
@@ -17,46 +137,367 @@ class Connection11(object):
         self.match_result = None
         self.match_handler = None
         self.match_parameters = None
+        self.task = None
+        self.requests_count = 0
+        # True while waiting for first byte of next request, such connection can be closed by shutdown at any time.
+        self.is_idle = False
+        # Single parser per connection, so bytes of pipelined requests received together are never lost.
+        self._parser = HttpRequestParser(self)
+        self._parsing_request = None
+        self._ready_requests = deque()
+        self._is_parser_broken = False
+        # Bytes received after request which switches protocol, see handlers.websocket.
+        self.upgrade_data = b''
+        # Request and response objects are reused for requests of persistent connection.
+        self._free_requests = []
+        self._response = None
+        # Preallocated per connection, data is parsed before next read, so it is never copied.
+        self._receive_view = memoryview(bytearray(server.receive_buffer_length))
+        # Kernel cannot encrypt, TLS connections have to copy data through userspace.
+        self.is_tls = isinstance(getattr(socket, '_socket', None), SSLSocket)
+        self.can_sendfile = (sendfile is not None) and not self.is_tls
+        self.can_sendmsg = hasattr(socket, 'sendmsg') and not self.is_tls
+        # Set by TLS handshake.
+        self.alpn_protocol = None
+        self.tls_handshake_time = None
+
+        try:
+            # Responses are written with as few system calls as possible, Nagle's algorithm only adds latency.
+            socket.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+        except (AttributeError, OSError):
+            pass
+
+    def on_message_begin(self):
+        if self._free_requests:
+            self._parsing_request = self._free_requests.pop()
+        else:
+            self._parsing_request = Request(self)
+
+    def on_url(self, url):
+        self._parsing_request.on_url(url)
+
+    def on_header(self, name, value):
+        self._parsing_request.on_header(name, value)
+
+    def on_headers_complete(self):
+        self._parsing_request.on_headers_complete()
+        self._ready_requests.append(self._parsing_request)
+
+    def on_body(self, body):
+        self._parsing_request.on_body(body)
+
+    def on_message_complete(self):
+        self._parsing_request.on_message_complete()
+        self._parsing_request = None
+
+    def _feed_data(self, data):
+        # Returns False if no more requests can be parsed from this connection.
+        if self._is_parser_broken:
+            return False
+
+        try:
+            self._parser.feed_data(data)
+        except HttpParserUpgrade as error:
+            # Rest of data belongs to other protocol. Current request is served, then connection is closed
+            # unless handler takes it over.
+            self.upgrade_data = bytes(data[error.args[0]:])
+            self._is_parser_broken = True
+        except HttpParserError:
+            self._is_parser_broken = True
+
+            return False
+
+        return True
+
+    async def read_next_request(self):
+        # Requests are served in order they were received, returns None if connection should be closed.
+        if not self._ready_requests:
+            if self._is_parser_broken:
+                return None
+
+            if self._parsing_request is None:
+                # Persistent connection may stay idle between requests.
+                self.is_idle = True
+
+                try:
+                    data = await self.read_request_into(timeout=self.server.keep_alive_timeout if self.requests_count else self.server.header_timeout)
+                finally:
+                    self.is_idle = False
+
+                if (not data) or (not self._feed_data(data)):
+                    return None
+
+            if not self._ready_requests:
+                # Whole header must arrive in time, not every read.
+                async with self.timeout(self.server.header_timeout):
+                    while not self._ready_requests:
+                        data = await self.read_request_into()
+
+                        if (not data) or (not self._feed_data(data)):
+                            return None
+
+        self.requests_count += 1
+
+        return self._ready_requests.popleft()
+
+    def _release_request(self, request):
+        request.reset()
+        self._free_requests.append(request)
+
+    def _get_response(self, version, status_code=200, headers=None, request=None, hash_etag=False, compression=None):
+        if self._response is None:
+            self._response = Response(self, version, status_code, None, headers, request, hash_etag, compression)
+        else:
+            self._response.reset(version, status_code, None, headers, request, hash_etag, compression)
+
+        return self._response
+
+    def timeout(self, timeout):
+        return self.server.coarse_timeouts.timeout(timeout)
+
+    async def read_request(self, max_length=64 * 1024, timeout=None):
+        if max_length <= 0:
+            return b''
+
+        try:
+            async with self.timeout(timeout):
+                return await self.socket.recv(max_length)
+        except TaskTimeout:
+            # Timeout of enclosing block, e.g. header timeout, is not ours.
+            if not timeout:
+                raise
+
+            return b''
+
+    async def read_request_into(self, max_length=None, timeout=None):
+        # Returned memoryview is valid until next call only. Empty result means connection is closed or timed out.
+        # Reads at most receive_buffer_length of server.
+        max_length = len(self._receive_view) if max_length is None else min(max_length, len(self._receive_view))
 
-    async def read_request(self, max_length=64 * 1024):
         if max_length <= 0:
             return b''
 
         try:
-            return await timeout_after(1, self.socket.recv, max_length)
+            async with self.timeout(timeout):
+                length = await self.socket.recv_into(self._receive_view[:max_length])
         except TaskTimeout:
+            # Timeout of enclosing block, e.g. header timeout, is not ours.
+            if not timeout:
+                raise
+
             return b''
 
+        return self._receive_view[:length]
+
     async def write_response(self, data):
-        await self.socket.sendall(data)
+        async with self.timeout(self.server.write_timeout):
+            await self.socket.sendall(data)
+
+    async def _send_continue(self):
+        # Interim response to Expect: 100-continue, final response follows later.
+        await self.write_response(b'HTTP/1.1 100 Continue\r\n\r\n')
+
+    async def write_response_vector(self, buffers):
+        async with self.timeout(self.server.write_timeout):
+            await self._write_response_vector(buffers)
+
+    async def _write_response_vector(self, buffers):
+        # Gathered write of bytes, bytearray or memoryview objects without joining them.
+        if not self.can_sendmsg:
+            if sum(len(buffer) for buffer in buffers) <= MAX_JOINED_LENGTH:
+                await self.socket.sendall(b''.join(buffers))
+            else:
+                for buffer in buffers:
+                    await self.socket.sendall(buffer)
+
+            return
+
+        buffers = [memoryview(buffer).cast('B') for buffer in buffers if len(buffer) > 0]
+        socket_fileno = self.socket.fileno()
+        sendmsg = self.socket._socket.sendmsg
+
+        while buffers:
+            try:
+                sent_length = sendmsg(buffers[:MAX_VECTOR_LENGTH])
+            except BlockingIOError:
+                await _write_wait(socket_fileno)
+                continue
+
+            while sent_length > 0:
+                if sent_length >= len(buffers[0]):
+                    sent_length -= len(buffers[0])
+                    del buffers[0]
+                else:
+                    buffers[0] = buffers[0][sent_length:]
+                    sent_length = 0
+
+    async def write_file(self, file, offset, length, chunk_length=64 * 1024, run_blocking=None):
+        # Write timeout is applied to every sendfile or read call separately, file may be large.
+        # run_blocking(function, *args) executes file reads, e.g. in thread pool, inline if None.
+        # sendfile is always called inline, socket is non-blocking and thread hop would cost more than the call itself.
+        if self.can_sendfile:
+            socket_fileno = self.socket.fileno()
+            file_fileno = file.fileno()
+
+            while length > 0:
+                try:
+                    sent_length = sendfile(socket_fileno, file_fileno, offset, length)
+                except BlockingIOError:
+                    async with self.timeout(self.server.write_timeout):
+                        await _write_wait(socket_fileno)
+
+                    continue
+
+                if sent_length == 0:
+                    # File was truncated after Content-Length was sent, nothing can be done.
+                    raise EOFError(f'File "{file.name}" is shorter than expected.')
+
+                offset += sent_length
+                length -= sent_length
+        else:
+            file.seek(offset)
+
+            while length > 0:
+                if run_blocking:
+                    data = await run_blocking(file.read, min(chunk_length, length))
+                else:
+                    data = file.read(min(chunk_length, length))
+
+                if not data:
+                    raise EOFError(f'File "{file.name}" is shorter than expected.')
+
+                await self.write_response(data)
+                length -= len(data)
 
 
 class Server11(object):
-    def __init__(self, router, middlewares=None, default_headers=None):
+    # header_timeout limits time to receive request headers after first byte of request.
+    # keep_alive_timeout limits time to wait for next request on persistent connection.
+    # body_timeout limits time of every read of request body, write_timeout limits time of every write.
+    # Timeouts are coarse, their precision is timer_resolution seconds.
+    # Requests are rejected with 503 when there are more than max_connections open connections, more than max_requests
+    # handlers are running or event loop lags more than max_loop_lag seconds. Limits are disabled if None.
+    # shutdown_timeout limits time to complete in-flight requests after shutdown, remaining connections are cancelled.
+    # Requests with Content-Length greater than max_body_length are rejected with 413 before handler is called.
+    # receive_buffer_length is size of receive buffer allocated for every connection, it limits length of single read.
+    def __init__(
+            self, router, middlewares=None, default_headers=None, hash_etag=False, compression=None,
+            header_timeout=10, keep_alive_timeout=5, body_timeout=10, write_timeout=30, timer_resolution=1.0,
+            max_discarded_body_length=64*1024, max_connections=None, max_requests=None, max_loop_lag=None,
+            retry_after=1, backlog=1024, shutdown_timeout=30, max_body_length=None, receive_buffer_length=RECEIVE_BUFFER_LENGTH):
         self.router = router
+        self.receive_buffer_length = receive_buffer_length
+        self.max_body_length = max_body_length
+        # Body not read by handler is skipped to reach next request, connection is closed if body is longer.
+        self.max_discarded_body_length = max_discarded_body_length
+        self.header_timeout = header_timeout
+        self.keep_alive_timeout = keep_alive_timeout
+        self.body_timeout = body_timeout
+        self.write_timeout = write_timeout
+        self.coarse_timeouts = CoarseTimeouts(timer_resolution)
+        self.loop_lag_monitor = LoopLagMonitor(timer_resolution)
+        self.max_connections = max_connections
+        self.max_requests = max_requests
+        self.max_loop_lag = max_loop_lag
+        self.retry_after = retry_after
+        self.backlog = backlog
+        self.connections_count = 0
+        self.requests_count = 0
+        self.shutdown_timeout = shutdown_timeout
+        self.is_shutting_down = False
+        self._connections = set()
+        self._shutdown_event = None
+        self._is_shutdown_signaled = False
+        self._accept_error = None
+        self.tls_metrics = TLSMetrics()
+        self.hash_etag = hash_etag
+        # Instance of compression.Compression, responses are not compressed by default.
+        self.compression = compression
         self.middlewares = []
 
         if middlewares:
             self.middlewares += list(middlewares)
 
         self.default_headers = default_headers
+        # Serialized once, not for every response.
+        self._default_headers = PreparedHeaders(default_headers) if default_headers else None
 
     async def client_connected(self, client, addr):
+        await self.loop_lag_monitor.start()
         connection = Connection11(client, addr, self)
+        connection.task = await current_task()
+        self.connections_count += 1
+        self._connections.add(connection)
 
-        while True:
-            request = Request(connection)
+        try:
+            if connection.is_tls:
+                await self._do_handshake(connection)
 
-            if not await request._try_read_headers():
-                break
+            await self._serve_connection(connection)
+        except (TaskTimeout, OSError, EOFError):
+            # Client is too slow or gone, there is nobody to respond to.
+            pass
+        finally:
+            self.connections_count -= 1
+            self._connections.discard(connection)
+
+        try:
+            await client.shutdown(SHUT_RDWR)
+        except OSError:
+            pass
+
+        await client.close()
+
+    async def _do_handshake(self, connection):
+        # Handshake is done by connection task, so slow client does not block accepting other connections.
+        started = monotonic()
+
+        try:
+            async with connection.timeout(self.header_timeout):
+                await connection.socket.do_handshake()
+        except (TaskTimeout, OSError):
+            self.tls_metrics.add_failure()
+            raise
+
+        ssl_socket = connection.socket._socket
+        connection.tls_handshake_time = monotonic() - started
+        connection.alpn_protocol = ssl_socket.selected_alpn_protocol()
+        self.tls_metrics.add_handshake(connection.tls_handshake_time, ssl_socket.session_reused, connection.alpn_protocol)
+
+    def _is_overloaded(self):
+        if (self.max_requests is not None) and (self.requests_count >= self.max_requests):
+            return True
+
+        if (self.max_loop_lag is not None) and (self.loop_lag_monitor.lag > self.max_loop_lag):
+            return True
+
+        return False
 
+    async def _serve_request(self, connection, request, is_rejected=False):
+        # Routes request and sends complete response. Connection is Connection11 or anything with same interface.
+        if is_rejected or self._is_overloaded():
+            response = connection._get_response(request.version, status_code=503, headers=self._default_headers)
+            # Closing connection releases resources sooner, client retries on new one.
+            request.keep_alive = False
+            await self.on_overload(request, response)
+        else:
             match_result, match_handler, match_parameters = self.router.match(request.path, request.method)
 
+            if (match_result < 400) and (self.max_body_length is not None) and ((request.headers.content_length or 0) > self.max_body_length):
+                # Client which expects 100 Continue does not send body at all, others are disconnected after response.
+                match_result = 413
+
             if match_result >= 400:
-                response = Response(connection, request.version, status_code=match_result, headers=self.default_headers)
+                # Request is passed only to close connection if client waits for 100 Continue, 4xx responses have no validators.
+                response = connection._get_response(
+                    request.version, status_code=match_result, headers=self._default_headers, request=request)
                 await self.on_4xx_error(request, response)
             else:
-                response = Response(connection, request.version, status_code=200, headers=self.default_headers)
+                response = connection._get_response(
+                    request.version, status_code=200, headers=self._default_headers, request=request, hash_etag=self.hash_etag, compression=self.compression)
+
+                self.requests_count += 1
+                request._is_in_flight = True
 
                 try:
                     has_response = False
@@ -74,27 +515,281 @@ class Server11(object):
 
                     for middleware in self.middlewares:
                         await middleware.after(request, response)
+                except (CancelledError, EOFError):
+                    # Timeout or cancellation of connection, e.g. by shutdown, is not handler error, there is nobody to respond to.
+                    # So is client which closed connection before whole body was received.
+                    request.keep_alive = False
+                    raise
                 except:
                     if not response._are_headers_sent:
-                        response = Response(connection, request.version, status_code=500, headers=self.default_headers)
+                        response = Response(connection, request.version, status_code=500, headers=self._default_headers)
                         await self.on_5xx_error(request, response, match_handler)
+                    else:
+                        # Response is incomplete, connection cannot be reused.
+                        request.keep_alive = False
+                finally:
+                    self._end_in_flight(request)
+
+        await response._send_headers()
+        await response._send_body(b'')
+
+    def _end_in_flight(self, request):
+        # Long-lived responses, e.g. event streams and WebSocket connections, call it when they start, so they are not
+        # counted by max_requests, otherwise idle subscribers would make server reject all other requests.
+        if request._is_in_flight:
+            request._is_in_flight = False
+            self.requests_count -= 1
+
+    async def _upgrade(self, connection, request):
+        # Returns True if connection was switched to other protocol and served by it. No protocols are supported here.
+        return False
 
-            await response._send_headers()
-            await response._send_body(b'')
+    async def _serve_connection(self, connection):
+        # Connection over limit is not dropped silently, client receives 503 for its first request.
+        is_rejected = (self.max_connections is not None) and (self.connections_count > self.max_connections)
 
-            if not request.keep_alive:
+        while True:
+            request = await connection.read_next_request()
+
+            if request is None:
                 break
 
-        await client.shutdown(SHUT_RDWR)
-        await client.close()
+            if request.upgrade and (not is_rejected) and await self._upgrade(connection, request):
+                break
+
+            await self._serve_request(connection, request, is_rejected)
+
+            if (not request.keep_alive) or self.is_shutting_down:
+                break
+
+            if not await request._discard_body(self.max_discarded_body_length):
+                break
+
+            connection._release_request(request)
+
+    async def _run_client(self, client, addr):
+        async with client:
+            await self.client_connected(client, addr)
+
+    async def _accept(self, sock, ssl=None):
+        while True:
+            try:
+                client, addr = await sock.accept()
+            except OSError as e:
+                if e.errno in ACCEPT_RETRY_ERRORS:
+                    await async_sleep(ACCEPT_RETRY_DELAY)
+                    continue
+
+                # Server is shut down and run raises the error, instead of waiting for connections which never come.
+                self._accept_error = e
+                await self.shutdown()
+
+                return
+
+            if ssl is not None:
+                client = Socket(ssl.wrap_socket(client._socket, server_side=True, do_handshake_on_connect=False))
+            await spawn(self._run_client, client, addr, daemon=True)
+            del client
+
+    async def _watch_signals(self):
+        # Signal handler cannot safely wake kernel, so flag is polled.
+        while not self._is_shutdown_signaled:
+            await async_sleep(self.loop_lag_monitor.interval)
+
+        await self.shutdown()
+
+    def _on_shutdown_signal(self, signal_number, frame):
+        self._is_shutdown_signaled = True
+
+    async def _drain(self):
+        # Idle keep-alive connections are closed at once, others are closed after their current response.
+        for connection in tuple(self._connections):
+            if connection.is_idle:
+                await connection.task.cancel(blocking=False)
+
+        deadline = monotonic() + self.shutdown_timeout
+
+        while self._connections and (monotonic() < deadline):
+            await async_sleep(0.1)
+
+        for connection in tuple(self._connections):
+            await connection.task.cancel()
+
+    async def shutdown(self):
+        # Stops accepting connections, run returns when in-flight requests are completed or shutdown_timeout expires.
+        self.is_shutting_down = True
+
+        if self._shutdown_event is not None:
+            await self._shutdown_event.set()
 
-    async def run(self, host='0.0.0.0', port=80, ssl=None):
-        await tcp_server(
-            host, port,
-            self.client_connected,
-            backlog=1024,
-            ssl=None,
-            reuse_address=True) #,  reuse_port=True)
+    async def run(self, host='0.0.0.0', port=80, ssl=None, reuse_port=False, shutdown_signals=(SIGTERM,), sockets=None):
+        # ssl is ssl.SSLContext, see tls.create_ssl_context. Connections are plain HTTP if None.
+        # Signals in shutdown_signals start graceful shutdown, signal handlers can only be set in main thread.
+        # sockets are listening sockets created by caller, see listeners module, host and port are ignored then.
+        # Such sockets are not closed, so connections queued in them are accepted by next process after restart.
+        if sockets:
+            own_sockets = []
+        else:
+            own_sockets = [tcp_server_socket(host, port, backlog=self.backlog, reuse_address=True, reuse_port=reuse_port)]
+            sockets = own_sockets
+
+        previous_handlers = {}
+        self.is_shutting_down = False
+        self._is_shutdown_signaled = False
+        self._shutdown_event = Event()
+        self._accept_error = None
+
+        try:
+            for signal_number in shutdown_signals:
+                previous_handlers[signal_number] = signal(signal_number, self._on_shutdown_signal)
+        except ValueError:
+            pass
+
+        try:
+            accept_tasks = [await spawn(self._accept, sock, ssl, daemon=True) for sock in sockets]
+            signal_task = await spawn(self._watch_signals, daemon=True) if previous_handlers else None
+
+            try:
+                await self._shutdown_event.wait()
+            finally:
+                for accept_task in accept_tasks:
+                    await accept_task.cancel()
+
+                if signal_task is not None:
+                    await signal_task.cancel()
+
+                for signal_number, handler in previous_handlers.items():
+                    signal(signal_number, handler)
+        finally:
+            for sock in own_sockets:
+                await sock.close()
+
+        await self._drain()
+
+        if self._accept_error is not None:
+            raise self._accept_error
+
+    def _spawn_worker(self, host, port, ssl, sockets, wakeup_fds=()):
+        pid = fork()
+
+        if pid == 0:
+            # Worker process, never returns.
+            exit_code = 0
+
+            # Signals caught by worker must not wake up supervisor through inherited wakeup pipe.
+            set_wakeup_fd(-1)
+
+            for fd in wakeup_fds:
+                close(fd)
+
+            # Ctrl-C in terminal reaches whole process group, workers wait for SIGTERM from supervisor to stop gracefully.
+            signal(SIGCHLD, SIG_DFL)
+            signal(SIGHUP, SIG_DFL)
+            signal(SIGINT, SIG_IGN)
+            signal(SIGTERM, SIG_DFL)
+
+            try:
+                run(self.run(host, port, ssl, reuse_port=True, sockets=sockets))
+            except:
+                # Supervisor's stdout may be used for other output, errors go to stderr.
+                print_exc()
+                exit_code = 1
+            finally:
+                _exit(exit_code)
+
+        return pid
+
+    def run_workers(self, host='0.0.0.0', port=80, ssl=None, workers=None, restart_delay=1, sockets=None):
+        # Must be called outside of curio kernel, each worker starts its own kernel.
+        # Every worker binds the same port with SO_REUSEPORT, kernel balances accepted connections.
+        # If sockets are given, workers inherit them instead, supervisor keeps them open across worker restarts.
+        # SIGTERM and SIGINT stop workers and supervisor, SIGHUP restarts workers.
+        # Workers shut down gracefully, on SIGHUP new workers are started before old ones stop accepting connections.
+        if not workers:
+            workers = cpu_count() or 1
+
+        worker_started = {}
+        retired_workers = set()
+        # Monotonic times when crashed workers are started again.
+        pending_restarts = []
+        is_running = True
+
+        # Signal handlers do nothing, signal numbers are written to wakeup pipe and handled by supervisor loop.
+        wakeup_fds = pipe()
+
+        for fd in wakeup_fds:
+            set_blocking(fd, False)
+
+        def spawn_worker():
+            worker_started[self._spawn_worker(host, port, ssl, sockets, wakeup_fds)] = monotonic()
+
+        def stop_workers():
+            for pid in tuple(retired_workers):
+                try:
+                    kill(pid, SIGTERM)
+                except ProcessLookupError:
+                    pass
+
+        previous_handlers = {
+            signal_number: signal(signal_number, _ignore_signal)
+            for signal_number in (SIGCHLD, SIGHUP, SIGINT, SIGTERM)
+        }
+        previous_wakeup_fd = set_wakeup_fd(wakeup_fds[1])
+
+        try:
+            for _ in range(workers):
+                spawn_worker()
+
+            while worker_started or retired_workers or pending_restarts:
+                timeout = max(0, min(pending_restarts) - monotonic()) if pending_restarts else None
+
+                if select((wakeup_fds[0],), (), (), timeout)[0]:
+                    for signal_number in read(wakeup_fds[0], 64):
+                        if signal_number == SIGHUP:
+                            if is_running:
+                                retired_workers.update(worker_started.keys())
+                                worker_started.clear()
+
+                                for _ in range(workers):
+                                    spawn_worker()
+
+                                stop_workers()
+                        elif signal_number in (SIGINT, SIGTERM):
+                            is_running = False
+                            pending_restarts.clear()
+                            retired_workers.update(worker_started.keys())
+                            stop_workers()
+
+                while True:
+                    try:
+                        pid, _ = waitpid(-1, WNOHANG)
+                    except ChildProcessError:
+                        break
+
+                    if not pid:
+                        break
+
+                    retired_workers.discard(pid)
+                    started = worker_started.pop(pid, None)
+
+                    if is_running and (started is not None):
+                        # Do not spin if worker cannot start at all, e.g. port is already in use.
+                        pending_restarts.append(max(monotonic(), started + restart_delay))
+
+                now = monotonic()
+
+                for restart_time in tuple(pending_restarts):
+                    if restart_time <= now:
+                        pending_restarts.remove(restart_time)
+                        spawn_worker()
+        finally:
+            set_wakeup_fd(previous_wakeup_fd)
+
+            for signal_number, handler in previous_handlers.items():
+                signal(signal_number, handler)
+
+            for fd in wakeup_fds:
+                close(fd)
 
     async def on_4xx_error(self, request, response):
         await response.send_html('''<html>
@@ -109,6 +804,12 @@ class Server11(object):
     request.method,
     request.raw_path.decode('ascii')))
 
+    async def on_overload(self, request, response):
+        # Must be cheap, it is called when server is already overloaded.
+        response.headers['Retry-After'] = str(self.retry_after)
+        response.headers['Connection'] = 'close'
+        await response.send_text(response.status_text)
+
     async def on_5xx_error(self, request, response, handler):
         await response.send_html('''<html>
 <head><title>{0}: {1}</title></head>
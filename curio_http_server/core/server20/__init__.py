@@ -0,0 +1,511 @@
+from ..request import Request
+from ..response import Response
+from ..server11 import Server11
+from collections import deque
+from curio import CancelledError
+from curio import Event
+from curio import Lock
+from curio import TaskCancelled
+from curio import TaskTimeout
+from curio import spawn
+from h2.config import H2Configuration
+from h2.connection import H2Connection
+from h2.errors import ErrorCodes
+from h2.events import ConnectionTerminated
+from h2.events import DataReceived
+from h2.events import RemoteSettingsChanged
+from h2.events import RequestReceived
+from h2.events import StreamEnded
+from h2.events import StreamReset
+from h2.events import WindowUpdated
+from h2.exceptions import H2Error
+from h2.exceptions import ProtocolError
+from h2.settings import SettingCodes
+from h2.settings import Settings
+from hyperframe.exceptions import HyperframeError
+
+
+# Client connection preface starts with this, it is how HTTP/2 with prior knowledge is recognized.
+PREFACE_START = b'PRI * HTTP/2.0'
+# Connection-specific headers are not allowed in HTTP/2, RFC 7540, section 8.1.2.2.
+CONNECTION_HEADER_NAMES = frozenset((b'connection', b'keep-alive', b'proxy-connection', b'transfer-encoding', b'upgrade'))
+
+
+def _encode_header_value(value):
+    if type(value) is bytes:
+        return value
+
+    return str(value).encode('ascii')
+
+
+class Stream20(object):
+    # Plays role of Connection11 for Request and Response of single stream, also parser of Request.
+    is_framed = True
+
+    __slots__ = (
+        'connection', 'server', 'stream_id', 'address', 'task', 'request', '_parser', '_method', '_chunks', '_is_ended',
+        '_data_event', '_window_event', '_pending_headers')
+
+    def __init__(self, connection, stream_id):
+        self.connection = connection
+        self.server = connection.server
+        self.stream_id = stream_id
+        self.address = connection.address
+        self.task = None
+        self.request = None
+        self._parser = self
+        self._method = b'GET'
+        # (data, flow controlled length) received, but not read by request yet.
+        self._chunks = deque()
+        self._is_ended = False
+        self._data_event = Event()
+        self._window_event = Event()
+        self._pending_headers = None
+
+    def get_http_version(self):
+        return '2.0'
+
+    def should_keep_alive(self):
+        return True
+
+    def should_upgrade(self):
+        return False
+
+    def get_method(self):
+        return self._method
+
+    def _on_request(self, headers):
+        request = Request(self)
+        cookies = []
+
+        for name, value in headers:
+            if name == b':method':
+                self._method = value
+            elif name == b':path':
+                request.on_url(value)
+            elif name == b':authority':
+                if 'Host' not in request.headers:
+                    request.on_header(b'Host', value)
+            elif name == b'cookie':
+                # Cookie may be split into several header fields, RFC 7540, section 8.1.2.5.
+                cookies.append(value)
+            elif not name.startswith(b':'):
+                request.on_header(name, value)
+
+        if cookies:
+            request.on_header(b'Cookie', b'; '.join(cookies))
+
+        request.on_headers_complete()
+        self.request = request
+
+    def timeout(self, timeout):
+        return self.server.coarse_timeouts.timeout(timeout)
+
+    def _get_response(self, version, status_code=200, headers=None, request=None, hash_etag=False, compression=None):
+        return Response(self, version, status_code, None, headers, request, hash_etag, compression)
+
+    def _set_headers(self, status_code, items):
+        # Called by Response instead of serializing headers, they are sent before first data.
+        headers = [(b':status', b'%d' % status_code)]
+
+        for name, value in items:
+            name = name.lower().encode('ascii')
+
+            if name not in CONNECTION_HEADER_NAMES:
+                headers.append((name, _encode_header_value(value)))
+
+        self._pending_headers = headers
+
+    async def read_request_into(self, max_length=64 * 1024, timeout=None):
+        # Flow control window is returned to client only when data is read, so slow handler slows down client.
+        try:
+            async with self.timeout(timeout):
+                while (not self._chunks) and (not self._is_ended):
+                    await self._data_event.wait()
+                    self._data_event.clear()
+        except TaskTimeout:
+            # Timeout of enclosing block, e.g. header timeout, is not ours.
+            if not timeout:
+                raise
+
+            return b''
+
+        if not self._chunks:
+            if self._is_ended:
+                # Stream was ended by frame without data, so body is complete.
+                self.request.on_message_complete()
+
+            return b''
+
+        data, flow_controlled_length = self._chunks.popleft()
+        await self.connection._acknowledge_data(self, flow_controlled_length)
+
+        return data
+
+    def _feed_data(self, data):
+        self.request.on_body(data)
+
+        if self._is_ended and not self._chunks:
+            self.request.on_message_complete()
+
+        return True
+
+    async def _discard_data(self):
+        # Flow control window of unread data must be returned, it is shared by all streams of connection.
+        length = sum(flow_controlled_length for _, flow_controlled_length in self._chunks)
+        self._chunks.clear()
+
+        if length:
+            await self.connection._acknowledge_data(self, length)
+
+    async def _send_pending_headers(self, end_stream=False):
+        if self._pending_headers is not None:
+            headers = self._pending_headers
+            self._pending_headers = None
+            self.connection._h2.send_headers(self.stream_id, headers, end_stream=end_stream)
+            await self.connection._flush(self.task)
+
+            return True
+
+        return False
+
+    async def _send_data(self, data):
+        connection = self.connection
+        h2 = connection._h2
+        data = memoryview(data).cast('B')
+
+        while data:
+            window = min(h2.local_flow_control_window(self.stream_id), h2.max_outbound_frame_size)
+
+            if window <= 0:
+                # Client must send WINDOW_UPDATE, see Connection20._receive.
+                self._window_event.clear()
+                await self._window_event.wait()
+                continue
+
+            h2.send_data(self.stream_id, bytes(data[:window]))
+            data = data[window:]
+            await connection._flush(self.task)
+
+    async def write_response(self, data):
+        await self.write_response_vector((data,))
+
+    async def write_response_vector(self, buffers):
+        async with self.timeout(self.server.write_timeout):
+            await self._send_pending_headers()
+
+            for buffer in buffers:
+                if len(buffer) > 0:
+                    await self._send_data(buffer)
+
+    async def write_file(self, file, offset, length, chunk_length=64 * 1024, run_blocking=None):
+        # Data must be framed, so sendfile cannot be used.
+        file.seek(offset)
+
+        while length > 0:
+            if run_blocking:
+                data = await run_blocking(file.read, min(chunk_length, length))
+            else:
+                data = file.read(min(chunk_length, length))
+
+            if not data:
+                raise EOFError(f'File "{file.name}" is shorter than expected.')
+
+            await self.write_response(data)
+            length -= len(data)
+
+    async def _send_continue(self):
+        # Interim response to Expect: 100-continue is sent as informational headers.
+        async with self.timeout(self.server.write_timeout):
+            self.connection._h2.send_headers(self.stream_id, [(b':status', b'100')])
+            await self.connection._flush(self.task)
+
+    async def end(self):
+        # Response is complete.
+        async with self.timeout(self.server.write_timeout):
+            if not await self._send_pending_headers(end_stream=True):
+                self.connection._h2.end_stream(self.stream_id)
+
+            if not self._is_ended:
+                # Client still sends body nobody reads, RFC 7540, section 8.1.
+                self.connection._h2.reset_stream(self.stream_id, ErrorCodes.NO_ERROR)
+
+            await self.connection._flush(self.task)
+
+    async def reset(self):
+        try:
+            self.connection._h2.reset_stream(self.stream_id)
+            await self.connection._flush(self.task)
+        except (TaskTimeout, OSError, H2Error):
+            pass
+
+
+class Connection20(object):
+    # HTTP/2 connection, runs on top of Connection11, which provides socket, buffers and timeouts of connection task.
+    # Every stream is served by separate task, connection task reads frames and dispatches them to streams.
+    __slots__ = 'connection', 'server', 'address', 'task', 'is_rejected', '_h2', '_streams', '_write_lock', '_is_closed'
+
+    def __init__(self, connection, server, settings_header=None, is_rejected=False):
+        self.connection = connection
+        self.server = server
+        # Connection over max_connections, its streams receive 503 and it is closed when they are done.
+        self.is_rejected = is_rejected
+        self.address = connection.address
+        self.task = connection.task
+        self._h2 = H2Connection(H2Configuration(client_side=False, header_encoding=None))
+        self._streams = {}
+        self._write_lock = Lock()
+        self._is_closed = False
+        self._initiate(settings_header)
+
+    async def _flush(self, task):
+        # Frames must reach socket in order they were produced, lock keeps concurrent writers of streams in line.
+        async with self._write_lock:
+            data = self._h2.data_to_send()
+
+            if data:
+                try:
+                    async with self.server.coarse_timeouts.timeout(self.server.write_timeout):
+                        await self.connection.socket.sendall(data)
+                except:
+                    # Frame may be written partially, connection cannot be used anymore.
+                    self._is_closed = True
+
+                    if task is not self.task:
+                        await self.task.cancel(blocking=False)
+
+                    raise
+
+    async def _acknowledge_data(self, stream, flow_controlled_length):
+        if flow_controlled_length > 0:
+            self._h2.acknowledge_received_data(flow_controlled_length, stream.stream_id)
+            await self._flush(stream.task)
+
+    def _initiate(self, settings_header=None):
+        # Settings are sent with connection preface, not in separate frame.
+        # Raises ValueError, HyperframeError or H2Error if HTTP2-Settings header of upgrade request is invalid.
+        self._h2.local_settings = Settings(client=False, initial_values={
+            SettingCodes.MAX_CONCURRENT_STREAMS: self.server.max_streams,
+            SettingCodes.INITIAL_WINDOW_SIZE: self.server.window_size,
+        })
+
+        if settings_header is None:
+            self._h2.initiate_connection()
+        else:
+            self._h2.initiate_upgrade_connection(settings_header)
+
+        # Connection window is not changed by settings, default is 65535.
+        if self.server.window_size > 65535:
+            self._h2.increment_flow_control_window(self.server.window_size - 65535)
+
+    async def _start_stream(self, stream_id, headers=None, request=None):
+        stream = Stream20(self, stream_id)
+
+        if request is None:
+            try:
+                stream._on_request(headers)
+            except Exception:
+                # Malformed request, e.g. header which is not ASCII, is error of this stream only, RFC 7540, section 8.1.2.6.
+                self._h2.reset_stream(stream_id, ErrorCodes.PROTOCOL_ERROR)
+
+                return
+        else:
+            # Request received with HTTP/1.1 before upgrade, it has no body.
+            stream.request = request
+            stream._is_ended = True
+
+        self._streams[stream_id] = stream
+        stream.task = await spawn(self.server._serve_stream, self, stream, daemon=True)
+
+    async def _close_stream(self, stream):
+        self._streams.pop(stream.stream_id, None)
+        await stream._discard_data()
+
+        if (self.server.is_shutting_down or self.is_rejected) and not self._streams:
+            # Connection task is waiting for frames, it is woken up to close connection, see serve.
+            await self.task.cancel(blocking=False)
+
+    async def _receive(self, data):
+        try:
+            events = self._h2.receive_data(data)
+        except ProtocolError:
+            # GOAWAY is already queued by h2.
+            self._is_closed = True
+            await self._flush(self.task)
+
+            return
+
+        for event in events:
+            if isinstance(event, RequestReceived):
+                await self._start_stream(event.stream_id, event.headers)
+            elif isinstance(event, DataReceived):
+                stream = self._streams.get(event.stream_id)
+
+                if stream is None:
+                    self._h2.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                else:
+                    stream._chunks.append((event.data, event.flow_controlled_length))
+                    await stream._data_event.set()
+            elif isinstance(event, StreamEnded):
+                stream = self._streams.get(event.stream_id)
+
+                if stream is not None:
+                    stream._is_ended = True
+                    await stream._data_event.set()
+            elif isinstance(event, StreamReset):
+                stream = self._streams.get(event.stream_id)
+
+                if stream is not None:
+                    await stream.task.cancel(blocking=False)
+            elif isinstance(event, WindowUpdated):
+                await self._set_window_events(event.stream_id)
+            elif isinstance(event, RemoteSettingsChanged):
+                await self._set_window_events()
+            elif isinstance(event, ConnectionTerminated):
+                self._is_closed = True
+
+        await self._flush(self.task)
+
+    async def _set_window_events(self, stream_id=0):
+        if stream_id:
+            streams = (self._streams[stream_id],) if stream_id in self._streams else ()
+        else:
+            streams = tuple(self._streams.values())
+
+        for stream in streams:
+            await stream._window_event.set()
+
+    async def serve(self, data=b'', request=None):
+        # request is set if connection was upgraded from HTTP/1.1, it is served as stream 1.
+        await self._flush(self.task)
+
+        if request is not None:
+            await self._start_stream(1, request=request)
+
+        try:
+            if data:
+                await self._receive(data)
+
+            while not self._is_closed:
+                if self.server.is_shutting_down and not self._streams:
+                    break
+
+                # Idle connection, which has no streams, is closed by keep-alive timeout or shutdown.
+                self.connection.is_idle = not self._streams
+
+                try:
+                    data = await self.connection.read_request_into(timeout=None if self._streams else self.server.keep_alive_timeout)
+                except TaskCancelled:
+                    # Connection without streams is cancelled by shutdown or rejection, client is told to go away.
+                    if not ((self.server.is_shutting_down or self.is_rejected) and not self._streams):
+                        raise
+
+                    break
+                finally:
+                    self.connection.is_idle = False
+
+                if not data:
+                    break
+
+                await self._receive(data)
+        finally:
+            for stream in tuple(self._streams.values()):
+                await stream.task.cancel(blocking=False)
+
+        if not self._is_closed:
+            self._h2.close_connection()
+            await self._flush(self.task)
+
+
+class Server20(Server11):
+    # HTTP/2 server, HTTP/1.1 is served as by Server11 to clients which do not support HTTP/2.
+    # HTTP/2 is selected by ALPN with TLS, see tls.create_ssl_context(alpn_protocols=('h2', 'http/1.1')).
+    # Cleartext connections use HTTP/2 if client starts with connection preface (prior knowledge) or sends Upgrade: h2c.
+    # max_streams limits concurrent streams of one connection, window_size is receive flow control window.
+    def __init__(self, router, max_streams=100, window_size=1024 * 1024, **kwargs):
+        super().__init__(router, **kwargs)
+        self.max_streams = max_streams
+        self.window_size = window_size
+
+    async def _serve_stream(self, connection, stream):
+        try:
+            await self._serve_request(stream, stream.request, connection.is_rejected)
+            await stream.end()
+        except (CancelledError, OSError, EOFError, H2Error):
+            # Stream was reset by client or cancelled, client is too slow or connection is gone.
+            if not connection._is_closed:
+                await stream.reset()
+        finally:
+            await connection._close_stream(stream)
+
+    async def _upgrade(self, connection, request):
+        if connection.is_tls or (request.headers.get('Upgrade', '').lower() != 'h2c'):
+            return False
+
+        settings_header = request.headers.get('HTTP2-Settings')
+        body_length = request.headers.content_length or 0
+
+        if (settings_header is None) or ('Transfer-Encoding' in request.headers):
+            # Upgrade is optional for server, request is served with HTTP/1.1.
+            return False
+
+        if (self.max_body_length is not None) and (body_length > self.max_body_length):
+            return False
+
+        try:
+            connection20 = Connection20(connection, self, settings_header.encode('ascii'))
+        except (ValueError, HyperframeError, H2Error):
+            # Invalid settings, request is served with HTTP/1.1.
+            return False
+
+        # Parser stops at end of headers of upgrade request, so body and HTTP/2 frames which follow it are upgrade data.
+        # Client sends whole body before it switches protocols, RFC 7540, section 3.2.
+        data = connection.upgrade_data
+
+        if body_length:
+            async with connection.timeout(self.body_timeout):
+                while len(data) < body_length:
+                    chunk = await connection.read_request(body_length - len(data))
+
+                    if not chunk:
+                        raise EOFError('Request body is incomplete.')
+
+                    data += chunk
+
+            request.on_body(data[:body_length])
+            data = data[body_length:]
+
+        await connection.write_response(b'HTTP/1.1 101 Switching Protocols\r\nConnection: Upgrade\r\nUpgrade: h2c\r\n\r\n')
+        await connection20.serve(data, request=request)
+
+        return True
+
+    async def _serve_connection(self, connection):
+        # Connection over limit is not dropped silently, see Server11._serve_connection.
+        is_rejected = (self.max_connections is not None) and (self.connections_count > self.max_connections)
+
+        if connection.is_tls:
+            if connection.alpn_protocol == 'h2':
+                await Connection20(connection, self, is_rejected=is_rejected).serve()
+            else:
+                await super()._serve_connection(connection)
+
+            return
+
+        # Preface may be split into several segments, protocol is known when it is received whole or data differs from it.
+        data = b''
+
+        async with connection.timeout(self.header_timeout):
+            while (len(data) < len(PREFACE_START)) and PREFACE_START.startswith(data):
+                chunk = await connection.read_request_into()
+
+                if not chunk:
+                    return
+
+                data += chunk
+
+        if data.startswith(PREFACE_START):
+            await Connection20(connection, self, is_rejected=is_rejected).serve(data)
+        elif connection._feed_data(data):
+            # Bytes already read belong to first HTTP/1.1 request.
+            await super()._serve_connection(connection)
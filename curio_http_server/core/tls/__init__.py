@@ -0,0 +1,61 @@
+from ssl import OP_NO_COMPRESSION
+from ssl import OP_NO_TICKET
+from ssl import PROTOCOL_TLS_SERVER
+from ssl import SSLContext
+from ssl import TLSVersion
+
+
+DEFAULT_ALPN_PROTOCOLS = ('http/1.1',)
+
+
+def create_ssl_context(
+        certfile, keyfile=None, password=None, alpn_protocols=DEFAULT_ALPN_PROTOCOLS, session_tickets=True,
+        minimum_version=TLSVersion.TLSv1_2, ciphers=None):
+    # Context must be created once and shared by all connections, OpenSSL session cache belongs to context.
+    # Session ticket keys are generated with context, so workers forked by run_workers resume each other's sessions.
+    context = SSLContext(PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certfile, keyfile, password)
+    context.minimum_version = minimum_version
+    context.options |= OP_NO_COMPRESSION
+
+    if not session_tickets:
+        context.options |= OP_NO_TICKET
+
+    if ciphers:
+        context.set_ciphers(ciphers)
+
+    if alpn_protocols:
+        context.set_alpn_protocols(list(alpn_protocols))
+
+    return context
+
+
+class TLSMetrics(object):
+    # Handshake statistics of Server11, handshake_time is total time in seconds spent in successful handshakes.
+    __slots__ = 'handshakes_count', 'resumed_count', 'failures_count', 'handshake_time', 'max_handshake_time', 'alpn_protocols'
+
+    def __init__(self):
+        self.handshakes_count = 0
+        self.resumed_count = 0
+        self.failures_count = 0
+        self.handshake_time = 0.0
+        self.max_handshake_time = 0.0
+        self.alpn_protocols = {}
+
+    def add_handshake(self, handshake_time, is_resumed, alpn_protocol):
+        self.handshakes_count += 1
+        self.handshake_time += handshake_time
+        self.max_handshake_time = max(self.max_handshake_time, handshake_time)
+
+        if is_resumed:
+            self.resumed_count += 1
+
+        if alpn_protocol:
+            self.alpn_protocols[alpn_protocol] = self.alpn_protocols.get(alpn_protocol, 0) + 1
+
+    def add_failure(self):
+        self.failures_count += 1
+
+    @property
+    def average_handshake_time(self):
+        return (self.handshake_time / self.handshakes_count) if self.handshakes_count else 0.0
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+from curio import run
+from curio import spawn
+from curio_http_server.core.router import Router
+from curio_http_server.core.server20 import Server20
+from curio_http_server.core.tls import create_ssl_context
+from os.path import exists
+
+
+async def version_handler(request, response):
+    # The same handler serves HTTP/1.1 and HTTP/2 clients.
+    # Request which upgrades connection with h2c is HTTP/1.1 request, its response and next requests use HTTP/2.
+    await response.send_text(f'Hello, HTTP/{request.version} client.\n')
+
+
+async def upload_handler(request, response):
+    # HTTP/2 request body is flow controlled, client sends more data only when handler reads it.
+    body = await request.read_body()
+    await response.send_text(f'Received {len(body)} bytes with HTTP/{request.version}.\n')
+
+
+async def stream_handler(request, response):
+    # Every HTTP/2 stream is served by its own task, streams of one connection do not wait for each other.
+    async with response.open_body() as stream:
+        for index in range(10):
+            await stream.write(f'Line {index}\n'.encode('ascii'))
+
+
+router = Router()
+router.add('/', version_handler, 'GET')
+router.add('/upload/', upload_handler, 'POST')
+router.add('/stream/', stream_handler, 'GET')
+
+# HTTP/2 server, requires h2 package (pip install curio-http-server[http2]).
+# Clients which do not support HTTP/2 are served with HTTP/1.1.
+plain_server = Server20(
+    router,
+    max_streams=100,
+    default_headers=(('Server', 'curio-http-server/1.2.3.4'),))
+tls_server = Server20(
+    router,
+    max_streams=100,
+    default_headers=(('Server', 'curio-http-server/1.2.3.4'),))
+
+
+async def main():
+    tasks = []
+    # Cleartext connections use HTTP/2 if client starts with connection preface (prior knowledge) or sends Upgrade: h2c.
+    tasks.append(await spawn(plain_server.run, '0.0.0.0', 8080))
+
+    if exists('cert.pem') and exists('key.pem'):
+        # TLS connections negotiate HTTP/2 with ALPN.
+        ssl_context = create_ssl_context('cert.pem', 'key.pem', alpn_protocols=('h2', 'http/1.1'))
+        tasks.append(await spawn(tls_server.run, '0.0.0.0', 8443, ssl_context, False, ()))
+
+    for task in tasks:
+        await task.join()
+
+
+print('Execute the following commands to test:')
+print('curl -i --http2-prior-knowledge http://localhost:8080/')
+print('curl -i --http2 http://localhost:8080/')
+print('curl -i --http1.1 http://localhost:8080/')
+print('curl -i --http2-prior-knowledge --data-binary @/etc/services http://localhost:8080/upload/')
+print('nghttp -nv http://localhost:8080/stream/ http://localhost:8080/ http://localhost:8080/stream/')
+
+if exists('cert.pem') and exists('key.pem'):
+    print('curl -i -k --http2 https://localhost:8443/')
+    print('curl -i -k --http1.1 https://localhost:8443/')
+else:
+    print('To test HTTP/2 with TLS and ALPN, create certificate and restart:')
+    print('openssl req -x509 -newkey rsa:2048 -nodes -keyout key.pem -out cert.pem -days 30 -subj /CN=localhost')
+
+run(main, with_monitor=True)
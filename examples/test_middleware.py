@@ -14,6 +14,8 @@ async def default_handler(request, response):
 # If you return True from before() the rest of middlewares as well as matched handler will not be executed.
 # Always return True if you send body.
 # You cannot change anything in after(), it's too late.
+# Store per request data in request.context dictionary, do not keep request or response after the request is served,
+# connection reuses them for next request.
 class Middleware(object):
     async def before(self, request, response):
         if request.method == 'POST':
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+
+from curio import run
+from curio_http_server.core.handlers.websocket import WebSocketHandler
+from curio_http_server.core.router import Router
+from curio_http_server.core.server11 import Server11
+
+
+async def echo_handler(request, websocket):
+    # receive returns str for text messages, bytes for binary messages and None when client is gone.
+    # Pings and close handshake are handled by WebSocket, do not forget to call receive even if you only send.
+    while True:
+        message = await websocket.receive()
+
+        if message is None:
+            break
+
+        # send waits until data is accepted by kernel, slow client slows down sender.
+        await websocket.send(message)
+
+
+router = Router()
+# WebSocket handler serves GET requests only, other requests get "426 Upgrade Required".
+# Messages are compressed with permessage-deflate if client supports it, pass compression_level=None to disable.
+router.add('/', WebSocketHandler(echo_handler, protocols=('echo',), ping_interval=20), 'GET')
+
+# HTTP 1.1 server
+server = Server11(
+    router,
+    default_headers=(('Server', 'curio-http-server/1.2.3.4'),))
+
+print('Execute the following commands to test:')
+print('python -m websockets ws://localhost:8080/')
+
+run(server.run(port=8080), with_monitor=True)
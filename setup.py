@@ -24,6 +24,9 @@ setup(
         'multidict>=4.5.1',
         'ua-parser>=0.8.0'
     ],
+    extras_require={
+        'http2': ['h2>=4.0'],
+    },
     classifiers=[
         'Environment :: Web Environment',
         'Intended Audience :: Developers',
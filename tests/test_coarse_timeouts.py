@@ -0,0 +1,108 @@
+from curio import Event
+from curio import TaskTimeout
+from curio import run
+from curio import sleep
+from curio import spawn
+from curio import timeout_after
+from curio_http_server.core.server11 import CoarseTimeouts
+from time import monotonic
+
+
+def _expect_timeout(coro_function, timeouts):
+    # Returns time it took for timeout to fire.
+    async def main():
+        started = monotonic()
+
+        try:
+            await coro_function(timeouts)
+        except TaskTimeout:
+            return monotonic() - started
+
+        raise AssertionError('TaskTimeout was not raised.')
+
+    return run(main)
+
+
+def test_coarse_timeout_passes_through_timeout_after():
+    async def guarded(timeouts):
+        async with timeouts.timeout(0.1):
+            async with timeout_after(5):
+                await sleep(2)
+
+    assert _expect_timeout(guarded, CoarseTimeouts(0.1)) < 1
+
+
+def test_timeout_after_nested_in_coarse_timeout():
+    timeouts = CoarseTimeouts(0.1)
+
+    async def main():
+        started = monotonic()
+
+        async with timeouts.timeout(5):
+            try:
+                async with timeout_after(0.1):
+                    await sleep(2)
+            except TaskTimeout:
+                pass
+
+        return monotonic() - started
+
+    assert run(main) < 1
+
+
+def test_timeout_after_works_after_coarse_timeout():
+    async def guarded(timeouts):
+        try:
+            async with timeouts.timeout(0.1):
+                await sleep(2)
+        except TaskTimeout:
+            pass
+
+        async with timeout_after(0.2):
+            await sleep(2)
+
+    assert _expect_timeout(guarded, CoarseTimeouts(0.1)) < 1
+
+
+def test_task_times_out_repeatedly():
+    timeouts = CoarseTimeouts(0.1)
+
+    async def main():
+        started = monotonic()
+
+        for _ in range(3):
+            try:
+                async with timeouts.timeout(0.1):
+                    await sleep(2)
+            except TaskTimeout:
+                pass
+
+        return monotonic() - started
+
+    assert run(main) < 2
+
+
+def test_cancel_after_coarse_timeout():
+    timeouts = CoarseTimeouts(0.1)
+
+    async def child(timed_out):
+        try:
+            async with timeouts.timeout(0.1):
+                await sleep(2)
+        except TaskTimeout:
+            await timed_out.set()
+
+        await sleep(5)
+
+    async def main():
+        timed_out = Event()
+        task = await spawn(child, timed_out)
+        await timed_out.wait()
+        started = monotonic()
+        await task.cancel()
+
+        return task.cancelled, monotonic() - started
+
+    cancelled, elapsed = run(main)
+
+    assert cancelled and (elapsed < 1)
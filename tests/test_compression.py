@@ -0,0 +1,47 @@
+from curio_http_server.core.compression import Compression
+from curio_http_server.core.headers.specific import AcceptEncodingHeader
+from zlib import decompress
+
+
+def test_parse_accept_encoding():
+    header = AcceptEncodingHeader._from_value('gzip, deflate;q=0.5, br;q=0, *;q=0.1')
+
+    assert header.get_quality('gzip') == 1.0
+    assert header.get_quality('deflate') == 0.5
+    assert header.get_quality('br') == 0.0
+    assert header.get_quality('zstd') == 0.1
+    assert AcceptEncodingHeader._from_value(None) is None
+
+
+def test_invalid_quality_disables_coding():
+    header = AcceptEncodingHeader._from_value('gzip;q=high, deflate')
+
+    assert header.get_quality('gzip') == 0.0
+    assert header.get_quality('deflate') == 1.0
+    assert header.get_quality('br') == 0.0
+
+
+def test_select_encoding():
+    compression = Compression()
+
+    assert compression.select_encoding(None) is None
+    assert compression.select_encoding(AcceptEncodingHeader._from_value('deflate, gzip')) == 'gzip'
+    assert compression.select_encoding(AcceptEncodingHeader._from_value('gzip;q=0.5, deflate')) == 'deflate'
+    assert compression.select_encoding(AcceptEncodingHeader._from_value('gzip;q=0, identity')) is None
+    assert compression.select_encoding(AcceptEncodingHeader._from_value('*')) == 'gzip'
+
+
+def test_is_compressible():
+    compression = Compression()
+
+    assert compression.is_compressible('text/html; charset=utf-8')
+    assert compression.is_compressible('application/json')
+    assert not compression.is_compressible('image/png')
+    assert not compression.is_compressible(None)
+
+
+def test_stream_compression():
+    compressor = Compression().create_compressor('gzip')
+    data = compressor.compress(b'Hello, ') + compressor.compress(b'world.') + compressor.finish()
+
+    assert decompress(data, 31) == b'Hello, world.'
@@ -0,0 +1,96 @@
+from curio_http_server.core.headers import RequestHeaders
+from curio_http_server.core.headers import _parse_http_date
+from curio_http_server.core.headers.specific import ETagHeader
+from curio_http_server.core.response import Response
+from datetime import datetime
+from datetime import timezone
+
+
+LAST_MODIFIED = datetime(2020, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+
+
+class _Request(object):
+    # Only what response needs to evaluate preconditions.
+    def __init__(self, method, headers):
+        self.method = method
+        self.headers = RequestHeaders(headers)
+        self.headers._post_process(self)
+
+
+def _get_status_code(method, request_headers, etag=None, last_modified=None, status_code=200):
+    response = Response(None, '1.1', status_code, request=_Request(method, request_headers))
+    response.headers.etag = etag
+    response.headers.last_modified = last_modified
+
+    return response._get_precondition_status_code()
+
+
+def test_parse_entity_tag_list():
+    tags = ETagHeader._from_list('"a", W/"b"')
+
+    assert [(tag.tag, tag.is_weak) for tag in tags] == [('a', False), ('b', True)]
+    assert ETagHeader._from_list('*')[0].tag == '*'
+    assert ETagHeader._from_list(None) is None
+
+
+def test_entity_tag_comparison():
+    strong = ETagHeader('a')
+    weak = ETagHeader('a', True)
+
+    assert strong.matches_strong(ETagHeader('a'))
+    assert not weak.matches_strong(strong)
+    assert weak.matches_weak(strong)
+    assert not strong.matches_weak(None)
+    assert ETagHeader('*').matches_strong(None)
+
+
+def test_parse_http_date():
+    assert _parse_http_date('Thu, 02 Jan 2020 03:04:05 GMT') == LAST_MODIFIED
+    assert _parse_http_date('Thu, 02 Jan 2020 03:04:05 -0000') == LAST_MODIFIED
+    assert _parse_http_date('yesterday') is None
+    assert _parse_http_date(None) is None
+
+
+def test_if_none_match():
+    headers = (('If-None-Match', '"a"'),)
+
+    assert _get_status_code('GET', headers, ETagHeader('a')) == 304
+    assert _get_status_code('GET', headers, ETagHeader('a', True)) == 304
+    assert _get_status_code('GET', headers, ETagHeader('b')) is None
+    assert _get_status_code('GET', (('If-None-Match', '*'),)) == 304
+
+
+def test_if_modified_since():
+    assert _get_status_code('GET', (('If-Modified-Since', 'Thu, 02 Jan 2020 03:04:05 GMT'),), last_modified=LAST_MODIFIED) == 304
+    assert _get_status_code('GET', (('If-Modified-Since', 'Thu, 02 Jan 2020 03:04:04 GMT'),), last_modified=LAST_MODIFIED) is None
+    # If-None-Match takes precedence.
+    headers = (('If-None-Match', '"b"'), ('If-Modified-Since', 'Thu, 02 Jan 2020 03:04:05 GMT'))
+    assert _get_status_code('GET', headers, ETagHeader('a'), LAST_MODIFIED) is None
+
+
+def test_if_match():
+    assert _get_status_code('GET', (('If-Match', '"a"'),), ETagHeader('a')) is None
+    assert _get_status_code('GET', (('If-Match', '"b"'),), ETagHeader('a')) == 412
+    assert _get_status_code('GET', (('If-Match', 'W/"a"'),), ETagHeader('a')) == 412
+    assert _get_status_code('GET', (('If-Match', '*'),), ETagHeader('a')) is None
+
+
+def test_if_match_without_entity_tag_is_ignored():
+    assert _get_status_code('GET', (('If-Match', '*'),)) is None
+    assert _get_status_code('GET', (('If-Match', '"a"'),)) is None
+
+
+def test_if_unmodified_since():
+    assert _get_status_code('GET', (('If-Unmodified-Since', 'Thu, 02 Jan 2020 03:04:04 GMT'),), last_modified=LAST_MODIFIED) == 412
+    assert _get_status_code('GET', (('If-Unmodified-Since', 'Thu, 02 Jan 2020 03:04:05 GMT'),), last_modified=LAST_MODIFIED) is None
+    assert _get_status_code('GET', (('If-Unmodified-Since', 'Thu, 02 Jan 2020 03:04:04 GMT'),)) is None
+
+
+def test_unsafe_methods_are_not_checked():
+    for method in ('POST', 'PUT', 'DELETE'):
+        assert _get_status_code(method, (('If-Match', '"b"'),), ETagHeader('a')) is None
+        assert _get_status_code(method, (('If-None-Match', '*'),)) is None
+
+
+def test_unsuccessful_responses_are_not_checked():
+    assert _get_status_code('GET', (('If-None-Match', '"a"'),), ETagHeader('a'), status_code=404) is None
@@ -0,0 +1,31 @@
+from curio_http_server.core.headers.specific import RangeHeader
+
+
+def test_parse_ranges():
+    header = RangeHeader._from_value('bytes=0-99, 200-, -50')
+
+    assert header.unit == 'bytes'
+    assert header.ranges == ((0, 99), (200, None), (None, 50))
+
+
+def test_invalid_header_is_ignored():
+    for value in ('', 'bytes', 'bytes=', 'bytes=a-b', 'bytes=5', 'bytes=-', 'bytes=10-5'):
+        assert RangeHeader._from_value(value) is None, value
+
+
+def test_resolve_clamps_to_length():
+    assert RangeHeader._from_value('bytes=0-99')._resolve(50) == ((0, 49),)
+    assert RangeHeader._from_value('bytes=10-')._resolve(50) == ((10, 49),)
+    assert RangeHeader._from_value('bytes=-10')._resolve(50) == ((40, 49),)
+    assert RangeHeader._from_value('bytes=-100')._resolve(50) == ((0, 49),)
+
+
+def test_resolve_drops_unsatisfiable_ranges():
+    assert RangeHeader._from_value('bytes=50-60, 0-0')._resolve(50) == ((0, 0),)
+    assert RangeHeader._from_value('bytes=50-')._resolve(50) == ()
+    assert RangeHeader._from_value('bytes=-0')._resolve(50) == ()
+
+
+def test_resolve_empty_representation():
+    for value in ('bytes=-3', 'bytes=0-', 'bytes=0-0'):
+        assert RangeHeader._from_value(value)._resolve(0) == (), value
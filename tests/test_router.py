@@ -0,0 +1,119 @@
+from curio_http_server.core.router import Router
+from random import Random
+from uuid import UUID
+
+
+async def first_handler(request, response):
+    pass
+
+
+async def second_handler(request, response):
+    pass
+
+
+def _linear_match(router, path, method_name):
+    # Reference matcher, checks every route, the latest added one wins.
+    method_name = method_name.lower()
+    result = (404, None, None)
+
+    for route in sorted(router.routes.values(), key=lambda route: route.index):
+        status_code, handler, parameters = route.match(path, method_name)
+
+        if status_code == 200:
+            result = (status_code, handler, parameters)
+        elif (status_code == 405) and (result[0] == 404):
+            result = (status_code, None, None)
+
+    return result
+
+
+def test_static_route():
+    router = Router()
+    router.add('/users/', first_handler, 'GET')
+
+    assert router.match('/users/', 'GET') == (200, first_handler, {})
+    assert router.match('/users', 'GET') == (404, None, None)
+    assert router.match('/users/', 'POST') == (405, None, None)
+
+
+def test_parameter_types():
+    router = Router()
+    router.add('/items/<item_id:int>/', first_handler, 'GET')
+    router.add('/tokens/<token:uuid>/', first_handler, 'GET')
+    router.add('/pages/<slug:slug>/', first_handler, 'GET')
+
+    assert router.match('/items/42/', 'GET') == (200, first_handler, {'item_id': 42})
+    assert router.match('/items/abc/', 'GET')[0] == 404
+    assert router.match('/tokens/12345678-1234-1234-1234-123456789abc/', 'GET')[2] == {
+        'token': UUID('12345678-1234-1234-1234-123456789abc')}
+    assert router.match('/pages/hello-world/', 'GET')[2] == {'slug': 'hello-world'}
+    assert router.match('/pages/hello.world/', 'GET')[0] == 404
+
+
+def test_path_parameter_matches_several_segments():
+    router = Router()
+    router.add('/static/<path:path>', first_handler, 'GET')
+
+    assert router.match('/static/css/site.css', 'GET') == (200, first_handler, {'path': 'css/site.css'})
+    assert router.match('/static/', 'GET') == (200, first_handler, {'path': ''})
+
+
+def test_latest_added_route_wins():
+    router = Router()
+    router.add('/<name>/', first_handler, 'GET')
+    router.add('/about/', second_handler, 'GET')
+
+    assert router.match('/about/', 'GET')[1] is second_handler
+    assert router.match('/other/', 'GET')[1] is first_handler
+
+
+def test_method_of_other_route_is_found():
+    router = Router()
+    router.add('/about/', first_handler, 'GET')
+    router.add('/<name>/', second_handler, 'POST')
+
+    assert router.match('/about/', 'GET')[1] is first_handler
+    assert router.match('/about/', 'POST')[1] is second_handler
+    assert router.match('/about/', 'PUT') == (405, None, None)
+
+
+def test_nested_router():
+    api = Router()
+    api.add('/users/<user_id:int>/', first_handler, 'GET')
+    router = Router()
+    router.add('/api/', api)
+
+    assert router.match('/api/users/7/', 'GET') == (200, first_handler, {'user_id': 7})
+
+
+def test_matches_linear_scan():
+    random = Random(1)
+    segments = ('a', 'b', '<name>', '<number:int>', '<slug:slug>', 'x.y', '<tail:path>')
+    paths = ('a', 'b', '1', 'x.y', 'x-y', 'ab', '')
+    methods = ('GET', 'POST')
+
+    for _ in range(200):
+        router = Router()
+
+        for _ in range(random.randint(1, 6)):
+            pattern_segments = [random.choice(segments) for _ in range(random.randint(1, 3))]
+
+            parameter_segments = [segment for segment in pattern_segments if segment.startswith('<')]
+
+            if ('<tail:path>' in pattern_segments[:-1]) or (len(set(parameter_segments)) < len(parameter_segments)):
+                continue
+
+            pattern = '/' + '/'.join(pattern_segments)
+            handler = random.choice((first_handler, second_handler))
+
+            try:
+                router.add(pattern, handler, random.choice(methods))
+            except RuntimeError:
+                # Same pattern with other parameter names.
+                continue
+
+        for _ in range(20):
+            path = '/' + '/'.join(random.choice(paths) for _ in range(random.randint(1, 4)))
+            method_name = random.choice(methods)
+
+            assert router.match(path, method_name) == _linear_match(router, path, method_name), path